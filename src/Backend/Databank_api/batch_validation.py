@@ -0,0 +1,143 @@
+import glob
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import yaml
+
+from schema_validator import InfoSchemaValidator, check_info
+
+logger = logging.getLogger('gunicorn.error')
+
+# Set in each pool process by _init_worker
+_worker = {}
+
+
+def _init_worker() -> None:
+    """Import the Databank and compile the schema once per pool process."""
+    from fairmd.lipids.schema_validation.validate_info_dict import parse_valid_config_settings
+    validator = InfoSchemaValidator()
+    validator.reload()
+    # Per item verdicts are returned to the client, don't log them from every process
+    log = logging.getLogger("batch_validation")
+    log.addHandler(logging.NullHandler())
+    log.propagate = False
+    _worker.update(parse=parse_valid_config_settings, validator=validator, log=log)
+
+
+def _validate_chunk(chunk: list, limit: int = None, structured: bool = False) -> list:
+    """
+    Validate [(id, (kind, source)), ...] in a pool process. kind is "doc" for an info
+    dict from the request body and "path" for a file found by iter_glob; only the
+    latter are read from disk.
+    """
+    results = []
+    for item_id, (kind, source) in chunk:
+        try:
+            if kind == "path":
+                with open(source, encoding="utf-8") as f:
+                    source = yaml.safe_load(f)
+            if not isinstance(source, dict) or not source:
+                error = "Not a YAML mapping"
+            else:
+                error, _ = check_info(source, _worker["parse"], _worker["validator"], _worker["log"],
+                                      limit, structured)
+        except Exception as e:
+            error = f"Failed to read: {e}"
+        results.append({"id": item_id, "valid": error is None, "error": error})
+    return results
+
+
+def iter_glob(base_path: str, pattern: str):
+    """
+    Iterator of (relative path, ("path", absolute path)) of the files matching pattern below base_path.
+    Raises ValueError right away for absolute patterns or patterns reaching outside base_path.
+    """
+    if os.path.isabs(pattern) or ".." in pattern.replace("\\", "/").split("/"):
+        raise ValueError("glob must be a relative pattern inside BILAYERDATA_PATH")
+    base = os.path.realpath(base_path)
+
+    def matches():
+        for path in glob.iglob(os.path.join(base, pattern), recursive=True):
+            real = os.path.realpath(path)
+            if real.startswith(base + os.sep) and os.path.isfile(real):
+                yield os.path.relpath(path, base), ("path", real)
+    return matches()
+
+
+class BatchValidator:
+    """
+    Validates many info files on a pool of `workers` processes and yields the
+    verdicts as they complete, not in input order.
+
+    Items are sent to the pool in chunks of `chunk_size`, and at most
+    `max_in_flight` chunks are outstanding at a time, so a batch of any size only
+    keeps a bounded number of items and results in memory. The pool is started on
+    the first batch and kept; reset() drops it after a refresh so the processes
+    are started again with the new schema.
+    """
+
+    def __init__(self, workers: int, chunk_size: int = 16, max_in_flight: int = None):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight or workers * 2
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn, forking a threaded gunicorn worker can copy locks held by other threads
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+            return self._pool
+
+    def reset(self) -> None:
+        """Drop the pool, running batches finish on the old processes."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def run(self, items, limit: int = None, structured: bool = False):
+        """
+        Validate an iterable of (id, ("doc", info dict)) or (id, ("path", file path))
+        items, see _validate_chunk. Yields one result dict per item and finally
+        {"summary": {...}}. limit and structured are passed to check_info.
+        """
+        start = time.perf_counter()
+        counts = {"total": 0, "valid": 0, "invalid": 0}
+        pool = self._get_pool()
+        pending = set()
+        items = iter(items)
+        try:
+            while True:
+                chunk = [item for _, item in zip(range(self.chunk_size), items)]
+                if chunk:
+                    pending.add(pool.submit(_validate_chunk, chunk, limit, structured))
+                if pending and (not chunk or len(pending) >= self.max_in_flight):
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        for result in future.result():
+                            counts["total"] += 1
+                            counts["valid" if result["valid"] else "invalid"] += 1
+                            yield result
+                if not chunk and not pending:
+                    break
+        except BrokenProcessPool:
+            logger.exception("Batch validation pool broke")
+            self.reset()
+            yield {"error": "Validation worker crashed, batch aborted"}
+        finally:
+            for future in pending:
+                future.cancel()
+
+        counts["seconds"] = round(time.perf_counter() - start, 3)
+        yield {"summary": counts}
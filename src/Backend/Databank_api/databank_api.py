@@ -1,15 +1,34 @@
-from flask import Flask, request, abort
+import time
+_import_started = time.perf_counter()
+
+from flask import Flask, Response, request, abort, stream_with_context
 import os, json, subprocess
-from fairmd.lipids.schema_validation.validate_info_dict import parse_valid_config_settings
-from fairmd.lipids import FMDL_MOL_PATH
-import fairmd.lipids.molecules as molecules
 import importlib
 import logging
+import sys
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import requests
+import yaml
 from api_return_standard import api_return
-from fairmd.lipids.schema_validation.validate_yaml import validate_info_dict
+from http_session import pooled_session, session_stats
+from prometheus_client import Counter, Gauge, Histogram
+from metrics import DEFAULT_BUCKETS, instrument_app, sampled
+from tracing import instrument_tracing, span, inject
+from payload_cache import PayloadCache, CACHE_CONTROL
+from validation_cache import ValidationCache
+from schema_validator import InfoSchemaValidator, check_info
+from batch_validation import BatchValidator, iter_glob
+from mapping_index import MappingIndex
+from mapping_content import MappingContentCache, find_mapping_file
+from molecule_search import MoleculeSearch
+from refresh_jobs import RefreshJobRunner
+from startup import StartupState
+from shared_state import SharedState, CatchUpRunner
 
 app = Flask(__name__)
+instrument_app(app)
 # Paths and filenames
 BILAYERDATA_PATH = os.getenv("BILAYERDATA_PATH", "/app/BilayerData")
 DATABANK_PATH = os.getenv("DATABANK_PATH", "/app/Databank")
@@ -17,74 +36,203 @@ LOCAL_STATIC = os.getenv("LOCAL_STATIC", "/app/static")
 MOLECULE_FILE = os.path.join(LOCAL_STATIC, "molecules.json")
 MAPPING_FILE = os.path.join(LOCAL_STATIC,"mapping-files.json")
 GITHUB_GATEWAY_URL = os.getenv("GITHUB_GATEWAY_URL", "http://github_gateway:5001")
+VALIDATION_CACHE_SIZE = int(os.getenv("VALIDATION_CACHE_SIZE", "1024"))
+# Schema errors reported per /info-valid-check request unless max_errors asks for fewer
+VALIDATION_MAX_ERRORS = int(os.getenv("VALIDATION_MAX_ERRORS", "50"))
+# Bytes of parsed mapping files kept in memory for /mapping-files/<molecule>/<filename>
+MAPPING_CONTENT_CACHE_BYTES = int(os.getenv("MAPPING_CONTENT_CACHE_BYTES", str(32 * 1024 * 1024)))
+# Processes used by /info-valid-check/batch
+BATCH_VALIDATION_WORKERS = int(os.getenv("BATCH_VALIDATION_WORKERS", str(os.cpu_count() or 2)))
+# Git pull settings: per-repo timeout in seconds and optional shallow fetch depth
+GIT_PULL_TIMEOUT = float(os.getenv("GIT_PULL_TIMEOUT", "120"))
+GIT_PULL_DEPTH = os.getenv("GIT_PULL_DEPTH")
+# "background" serves the persisted files right away and warms up in a thread,
+# "blocking" finishes the warm-up before gunicorn starts accepting requests
+STARTUP_MODE = os.getenv("STARTUP_MODE", "background")
+# Seconds before a failed background warm-up is retried, doubled per failure up to WARM_UP_RETRY_MAX
+WARM_UP_RETRY_BACKOFF = float(os.getenv("WARM_UP_RETRY_BACKOFF", "10"))
+WARM_UP_RETRY_MAX = float(os.getenv("WARM_UP_RETRY_MAX", "300"))
 
 # Ensure local static folder exists
 os.makedirs(LOCAL_STATIC, exist_ok=True)
 
-lipids_set    = molecules.lipids_set
-molecules_set = molecules.molecules_set
+# In-memory copies of the served JSON files, swapped whenever the files are rewritten
+molecule_payload = PayloadCache(MOLECULE_FILE)
+mapping_payload  = PayloadCache(MAPPING_FILE)
+# Earlier /info-valid-check verdicts, reset whenever the repositories are pulled
+validation_cache = ValidationCache(VALIDATION_CACHE_SIZE)
+# Compiled info.yml schema validator, rebuilt whenever the repositories are pulled
+info_validator = InfoSchemaValidator()
+# Process pool for batch validation, restarted whenever the validator is rebuilt
+batch_validator = BatchValidator(BATCH_VALIDATION_WORKERS)
+# Mapping file names per molecule, patched incrementally on refresh
+mapping_index = MappingIndex()
+# Parsed mapping file contents, cleared whenever mapping-files.json is rebuilt
+mapping_contents = MappingContentCache(MAPPING_CONTENT_CACHE_BYTES)
+# Prefix/fuzzy search over molecules.json, rebuilt whenever the file changes
+molecule_search = MoleculeSearch()
+# Commit SHAs of the repositories the served files were last built from
+built_heads = {}
+# Warm-up progress, /ready reports it
+startup = StartupState()
+# Lock and generation counter shared with the other gunicorn workers
+shared_state = SharedState(LOCAL_STATIC)
+
+# Durations of the refresh and validation stages, served at /metrics
+stage_seconds = Histogram("databank_stage_seconds", "Duration of refresh and validation stages", ("stage",),
+                          buckets=DEFAULT_BUCKETS)
+sampled(Gauge("databank_ready", "1 once the warm-up of every worker has finished", multiprocess_mode="livemin"),
+        lambda: int(startup.ready))
+sampled(Counter("validation_cache_requests_total", "Validation cache lookups by result", ("result",)),
+        lambda: {("hit",): validation_cache.hits, ("miss",): validation_cache.misses})
+
+# Databank modules, imported by load_databank() during warm-up
+molecules = None
+parse_valid_config_settings = None
+FMDL_MOL_PATH = None
+lipids_set    = None
+molecules_set = None
 
 logger = logging.getLogger('gunicorn.error')
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+instrument_tracing(app, "databank_api")
+
+
+@contextmanager
+def stage(name: str):
+    """Time a refresh or validation stage in stage_seconds and as a span of the current trace"""
+    with stage_seconds.labels(name).time(), span(name):
+        yield
 
 
-def pull_latest() -> None:
+def repo_head(path: str):
+    """Return the commit SHA checked out at path, or None if it can't be determined."""
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=path,
+                                capture_output=True, text=True, check=True)
+    except (subprocess.CalledProcessError, OSError) as e:
+        logger.warning("Could not read HEAD of %s: %s", path, e)
+        return None
+    return result.stdout.strip()
+
+def pull_repo(path: str, name: str) -> tuple:
+    """
+    Fast-forward the repository at path to its upstream.
+    Returns (sha before pull, sha after pull).
+    """
+    cmd = ["git", "pull", "--ff-only"]
+    if GIT_PULL_DEPTH:
+        cmd += ["--depth", GIT_PULL_DEPTH]
+    logger.info("Pulling latest %s repo at %s", name, path)
+    before = repo_head(path)
+    try:
+        with stage(f"git_pull_{name}"):
+            subprocess.run(cmd, cwd=path, check=True, timeout=GIT_PULL_TIMEOUT)
+    except subprocess.CalledProcessError as e:
+        logger.error("Failed to update %s repository: %s", name, e)
+        raise
+    except subprocess.TimeoutExpired as e:
+        logger.error("Pulling %s repository timed out after %s s", name, e.timeout)
+        raise
+    after = repo_head(path)
+    logger.info("%s at %s (was %s)", name, after, before)
+    return before, after
+
+def pull_latest() -> dict:
     """
-    Pull latest changes for BilayerData and Databank repositories.
+    Pull latest changes for BilayerData and Databank repositories concurrently.
+    Returns {repo name: (sha before pull, sha after pull)}.
     """
     repos = [
         (BILAYERDATA_PATH, "BilayerData"),
         (DATABANK_PATH, "Databank"),
     ]
 
-    for path, name in repos:
-        logger.info("Pulling latest %s repo at %s", name, path)
-        try:
-            subprocess.run(["git", "pull"], cwd=path, check=True)
-        except subprocess.CalledProcessError as e:
-            logger.error("Failed to update %s repository: %s", name, e)
-            raise
+    with ThreadPoolExecutor(max_workers=len(repos)) as pool:
+        futures = {name: pool.submit(pull_repo, path, name) for path, name in repos}
+    return {name: future.result() for name, future in futures.items()}
+
+def checked_out(heads: dict) -> dict:
+    """{repo name: sha after pull} from the result of pull_latest."""
+    return {name: after for name, (_, after) in heads.items()}
+
+def reset_validation_cache() -> None:
+    """Drop cached validation verdicts and key new ones by the checked out revisions."""
+    revision = f"{repo_head(DATABANK_PATH)}:{repo_head(BILAYERDATA_PATH)}"
+    validation_cache.reset(revision)
+    logger.info("Validation cache reset for revision %s", revision)
+
+@stage("validator_compile")
+def reload_validator() -> None:
+    """Rebuild the compiled schema validator from the checked out Databank."""
+    logger.info("Compiling info file schema validator")
+    info_validator.reload()
+    batch_validator.reset()
+
+def load_databank() -> None:
+    """Import the Databank modules used for validation and the molecule lists."""
+    global molecules, parse_valid_config_settings, FMDL_MOL_PATH
+    logger.info("Importing Databank modules")
+    from fairmd.lipids import FMDL_MOL_PATH
+    import fairmd.lipids.molecules as molecules
+    from fairmd.lipids.schema_validation.validate_info_dict import parse_valid_config_settings
+
+def reload_databank_modules() -> None:
+    """Reload the molecule lists and the config validator that imported them."""
+    global parse_valid_config_settings
+    importlib.reload(molecules)
+    validate_info_dict = importlib.reload(sys.modules["fairmd.lipids.schema_validation.validate_info_dict"])
+    parse_valid_config_settings = validate_info_dict.parse_valid_config_settings
 
-def refresh_molecule_file():
+@stage("molecule_reload")
+def refresh_molecule_file(reload=True):
     "Refreshes the local molecules.json file with updated molecule names."
     logger.info("Refreshing molecule file")
-    importlib.reload(molecules)
+    if reload:
+        reload_databank_modules()
 
     global lipids_set, molecules_set
+    lipids_set    = molecules.lipids_set
+    molecules_set = molecules.molecules_set
     lipids = sorted(molecules.lipids_set.names)
     solution = sorted(molecules.molecules_set.names)
 
     all_ids = {"lipids": lipids, "solution": solution}
 
-    out_path = MOLECULE_FILE
-    tmp_path = out_path + ".tmp"
-
-    with open(tmp_path, 'w') as f:
-        json.dump(all_ids, f, indent=2)
-    os.replace(tmp_path, out_path)
+    molecule_payload.store(all_ids)
+    molecule_search.sync(molecule_payload)
 
     logger.info("Wrote %d molecules to %s", len(all_ids), MOLECULE_FILE)
     return len(all_ids)
 
 
-def build_mapping_dict(base_path=FMDL_MOL_PATH):
-    logger.info("Building mapping dict from %s", base_path)
-    mapping_dict = {}
-    lipid_path = os.path.join(base_path, "membrane")
-    non_lipid_path = os.path.join(base_path, "solution")
-    for base_dir in (lipid_path, non_lipid_path):
-        for molecule in os.listdir(base_dir):
-            mol_dir = os.path.join(base_dir, molecule)
-            for fname in os.listdir(mol_dir):
-                if "mapping" in fname:
-                    mapping_dict.setdefault(molecule, []).append(fname)
-    for mapping_list in mapping_dict.values():
-        mapping_list.sort()
-
-    tmp = MAPPING_FILE + ".tmp"
-    with open(tmp, "w") as fp:
-        json.dump(mapping_dict, fp, indent=2)
-    os.replace(tmp, MAPPING_FILE)
+def build_mapping_dict(base_path=None, changed=None):
+    """
+    Writes mapping-files.json. Scans every molecule directory when changed is None,
+    otherwise rescans only the molecules in changed and patches the previous index.
+    """
+    base_path = base_path or FMDL_MOL_PATH
+    previous = mapping_index.mappings
+    if changed is not None and previous is None:
+        try:
+            previous = json.loads(mapping_payload.get()[0])
+        except FileNotFoundError:
+            changed = None
+
+    if changed is None:
+        logger.info("Building mapping dict from %s", base_path)
+        with stage("mapping_rebuild"):
+            mapping_dict = mapping_index.rebuild(base_path)
+    else:
+        if not changed:
+            logger.info("No molecule directories changed, keeping %s", MAPPING_FILE)
+            return len(previous)
+        logger.info("Updating mapping dict for %d changed molecule(s)", len(changed))
+        with stage("mapping_update"):
+            mapping_dict = mapping_index.update(base_path, changed, previous)
+
+    mapping_payload.store(mapping_dict)
+    mapping_contents.clear()
 
     logger.info("Wrote %d mappings to %s", len(mapping_dict), MAPPING_FILE)
     return len(mapping_dict)
@@ -93,12 +241,61 @@ def build_mapping_dict(base_path=FMDL_MOL_PATH):
 def list_mappings():
     """Return cached mapping files from mapping-files.json."""
     try:
-        with open(MAPPING_FILE, "r") as fp:
-            mapping_dict = json.load(fp)
+        return mapping_payload.respond()
     except FileNotFoundError as e:
         logger.error("Mapping file not found: %s", MAPPING_FILE)
         return api_return(error="Mapping file not available", status=404)
-    return api_return(payload=mapping_dict)
+
+
+@app.route("/mapping-files/<molecule>", methods=["GET"])
+def molecule_mappings(molecule):
+    """
+    GET /mapping-files/<molecule>?offset=&limit= - one page of the mapping files of a molecule.
+    """
+    try:
+        offset, limit = page_args(request.args)
+        mappings, _ = mapping_payload.data()
+    except ValueError as e:
+        return api_return(error=str(e), status=400)
+    except FileNotFoundError:
+        logger.error("Mapping file not found: %s", MAPPING_FILE)
+        return api_return(error="Mapping file not available", status=404)
+    if molecule not in mappings:
+        return api_return(error=f"No mapping files for molecule {molecule}", status=404)
+
+    files = mappings[molecule]
+    return api_return(payload={
+        "molecule": molecule,
+        "total": len(files),
+        "offset": offset,
+        "limit": limit,
+        "files": files[offset:offset + limit],
+    })
+
+
+@app.route("/mapping-files/<molecule>/<filename>", methods=["GET"])
+def mapping_file_content(molecule, filename):
+    """
+    GET /mapping-files/<molecule>/<filename> - the parsed contents of one mapping file, with an ETag.
+    """
+    if FMDL_MOL_PATH is None:
+        return api_return(error="Databank not loaded yet", status=503)
+    found = find_mapping_file(FMDL_MOL_PATH, molecule, filename)
+    if found is None:
+        return api_return(error=f"No mapping file {filename} for molecule {molecule}", status=404)
+    category, path = found
+    try:
+        body, etag = mapping_contents.get(path, {"molecule": molecule, "category": category, "file": filename})
+    except FileNotFoundError:
+        return api_return(error=f"No mapping file {filename} for molecule {molecule}", status=404)
+    except (OSError, UnicodeDecodeError, yaml.YAMLError):
+        logger.exception("Failed to read mapping file %s", path)
+        return api_return(error="Mapping file could not be read", status=500)
+
+    resp = Response(status=304) if request.if_none_match.contains(etag) else Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = CACHE_CONTROL
+    return resp
 
 
 @app.route('/molecules', methods=['GET'])
@@ -106,57 +303,130 @@ def list_molecules():
     """
     GET /molecules - returns local list of molecules.
     """
-    with open(MOLECULE_FILE, 'r') as f:
-        names = json.load(f)
-    return api_return(payload=names)
+    try:
+        return molecule_payload.respond()
+    except FileNotFoundError:
+        logger.error("Molecule file not found: %s", MOLECULE_FILE)
+        return api_return(error="Molecule file not available", status=404)
+
+
+@app.route('/molecules/search', methods=['GET'])
+def search_molecules():
+    """
+    GET /molecules/search?q=&offset=&limit= - molecules whose name starts with q,
+    followed by fuzzy (3-gram) matches, one page at a time.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return api_return(error="Missing query parameter q", status=400)
+    try:
+        offset, limit = page_args(request.args)
+        molecule_search.sync(molecule_payload)
+    except ValueError as e:
+        return api_return(error=str(e), status=400)
+    except FileNotFoundError:
+        logger.error("Molecule file not found: %s", MOLECULE_FILE)
+        return api_return(error="Molecule file not available", status=404)
+
+    results = molecule_search.search(query)
+    return api_return(payload={
+        "query": query,
+        "total": len(results),
+        "offset": offset,
+        "limit": limit,
+        "results": results[offset:offset + limit],
+    })
+
+
+def page_args(args, default_limit: int = 20, max_limit: int = 100) -> tuple:
+    """(offset, limit) from the query parameters, ValueError if they are invalid."""
+    try:
+        offset = int(args.get("offset", 0))
+        limit = int(args.get("limit", default_limit))
+    except ValueError:
+        raise ValueError("offset and limit must be integers") from None
+    if offset < 0 or limit < 1:
+        raise ValueError("offset must be >= 0 and limit >= 1")
+    return offset, min(limit, max_limit)
 
 
 @app.route("/refresh-databank-files", methods=["POST"])
 def refresh_databank_files():
     """
-    Pulls latest Databank repo, updates submodules,
-    rebuilds molecules.json and mapping-files.json.
+    Starts a background job that pulls the latest Databank and BilayerData repos
+    and rebuilds molecules.json and mapping-files.json. Returns 202 with the job id,
+    progress is reported by /refresh-status/<job_id>.
     """
     #Permission check
     err = admin_check()
     if err:
         logger.error(f"Admin check failed with error: {err}")
         return err
+    if not startup.ready:
+        return api_return(error="Databank is still loading, try again shortly", status=503)
+
+    job, created = refresh_jobs.submit()
+    if job is None:
+        return api_return(error="Databank is being updated by another worker, try again shortly", status=409)
+    if created:
+        logger.info("Started refresh job %s", job["job_id"])
+    else:
+        logger.info("Refresh job %s already running, not starting another", job["job_id"])
+    return api_return(payload=job, status=202)
+
+
+@app.route("/refresh-status/<job_id>", methods=["GET"])
+def refresh_status(job_id):
+    """
+    GET /refresh-status/<job_id> - state of a refresh job and each of its phases.
+    """
+    job = refresh_jobs.get(job_id)
+    if job is None:
+        return api_return(error="Unknown refresh job", status=404)
+    return api_return(payload=job)
+
 
+def run_refresh(job) -> None:
+    """
+    Pulls the repositories and rebuilds the served files, recording progress on job.
+    Readers keep getting the previous files until each one is swapped in.
+    Nothing is rebuilt when neither repository moved since the files were last built.
+    """
+    global built_heads
     #Pull & update submodules
-    try:
-        pull_latest()
-    except subprocess.CalledProcessError as e:
-        logger.exception("Git pull/submodule update failed")
-        return api_return(error="Failed to pull Databank repository", status=500)
-    except Exception as e:
-        logger.exception("Unexpected error during repo pull")
-        return api_return(error="Error updating Databank repository", status=500)
+    with job.phase("pull", "Failed to pull Databank repository"):
+        job.heads = pull_latest()
+        heads = checked_out(job.heads)
+        unchanged = None not in heads.values() and heads == built_heads
+
+    if unchanged:
+        logger.info("Repositories unchanged, skipping molecule and mapping rebuild")
+        job.skip("molecules")
+        job.skip("mappings")
+        return
 
     #Refresh molecules.json
-    try:
+    with job.phase("molecules", "Failed to refresh molecules list"):
         refresh_molecule_file()
-    except FileNotFoundError as e:
-        logger.exception("Molecules file path error")
-        return api_return(error="Molecule file path invalid", status=500)
-    except Exception as e:
-        logger.exception("Refreshing molecules failed")
-        return api_return(error="Failed to refresh molecules list", status=500)
+        # Not before the modules were reloaded: until here requests are validated with
+        # the old molecules and cached under the old revision, which the reset drops
+        reload_validator()
+        reset_validation_cache()
 
     #Rebuild mapping-files.json
-    try:
-        build_mapping_dict(FMDL_MOL_PATH)
-    except FileNotFoundError as e:
-        logger.exception("Mapping directory missing")
-        return api_return(error="Mapping source directory not found", status=500)
-    except json.JSONDecodeError as e:
-        logger.exception("Error writing mapping JSON")
-        return api_return(error="Failed to write mapping-files.json", status=500)
-    except Exception as e:
-        logger.exception("Building mapping dict failed")
-        return api_return(error="Failed to rebuild mapping dictionary", status=500)
+    with job.phase("mappings", "Failed to rebuild mapping dictionary"):
+        changed = mapping_index.changed_molecules(FMDL_MOL_PATH, BILAYERDATA_PATH,
+                                                  built_heads.get("BilayerData"), heads["BilayerData"])
+        build_mapping_dict(FMDL_MOL_PATH, changed)
 
-    return api_return(payload={"status":"success"})
+    built_heads = heads
+    shared_state.publish(heads)
+
+# Background runner for /refresh-databank-files, at most one refresh at a time
+refresh_jobs = RefreshJobRunner(run_refresh, shared_state, os.path.join(LOCAL_STATIC, "refresh-jobs"))
+
+# Keep-alive connections to the GitHub gateway for admin checks
+gateway_session = pooled_session("github_gateway")
 
 
 def admin_check():
@@ -167,7 +437,7 @@ def admin_check():
     headers = {'Authorization': auth}
     logger.info("Checking user admin status")
     try:
-        resp = requests.post(f"{GITHUB_GATEWAY_URL}/user-admin-check", headers=headers,timeout=10)
+        resp = gateway_session.post(f"{GITHUB_GATEWAY_URL}/user-admin-check", headers=inject(headers),timeout=10)
         resp.raise_for_status()
     except requests.HTTPError as e:
         logger.error(f"User admin check failed, error:{e}")
@@ -185,47 +455,242 @@ def admin_check():
 def info_valid_check():
     """
     POST /info-valid-check - validates provided YAML dict.
+    Query parameters: errors=structured returns the errors as a list of
+    {path, message, validator} instead of text, max_errors=N stops after N
+    schema errors (at most VALIDATION_MAX_ERRORS) and fail_fast=true after the first.
     """
     data = request.get_json()
     if not data:
         abort(400, description="Invalid or missing JSON payload")
     try:
-        parse_valid_config_settings(data,logger)
-    except Exception as e:
-        logger.error("Validation failed: %s", e)
+        limit, structured = validation_options(request.args)
+    except ValueError as e:
         return api_return(error=str(e), status=400)
-    try:
-        logger.info("Validating info file by schema")
-        errors = validate_info_dict(data) or []
-        if errors:
-            msg = format_schema_errors(errors)
-            logger.error("Schema validation failed:\n%s", msg)
-            return api_return(error=msg, status=400)
-
-        logger.info("No errors found in info file by schema")
+    if not startup.ready:
+        return api_return(error="Databank is still loading, try again shortly", status=503)
+
+    key = validation_cache.key(data, f"{limit}:{structured}")
+    hit, error = validation_cache.lookup(key)
+    if hit:
+        logger.info("Returning cached validation verdict")
+    else:
+        error, cacheable = validate_payload(data, limit, structured)
+        if cacheable:
+            validation_cache.store(key, error)
+
+    if error:
+        return api_return(error=error, status=400)
+    return api_return(payload={"valid": True}, status=200)
 
-    except Exception as e:
-        logger.error("Schema validation crashed: %s", e)
+@app.route('/info-valid-check/batch', methods=['POST'])
+def info_valid_check_batch():
+    """
+    POST /info-valid-check/batch - validates many info dicts on a process pool.
+    The body is a list of info dicts, or {"glob": pattern} to validate the files
+    matching pattern below BILAYERDATA_PATH. Streams one NDJSON line per item as
+    soon as it is validated ({"id", "valid", "error"}, id being the list index
+    or the relative file path), then a {"summary": ...} line. Takes the same
+    query parameters as /info-valid-check.
+    """
+    err = admin_check()
+    if err:
+        return err
+    data = request.get_json(silent=True)
+    try:
+        limit, structured = validation_options(request.args)
+    except ValueError as e:
         return api_return(error=str(e), status=400)
+    if not startup.ready:
+        return api_return(error="Databank is still loading, try again shortly", status=503)
 
-    return api_return(payload={"valid": True}, status=200)
-        
-def format_schema_errors(errors) -> str:
-    lines = []
-    for e in errors:
-        path = ".".join(str(p) for p in e.path) if e.path else "<root>"
-        lines.append(f"{path}: {e.message}")
-    return "\n".join(lines)
+    if isinstance(data, list):
+        # List items are documents, never paths, whatever their type
+        items = ((i, ("doc", item)) for i, item in enumerate(data))
+    elif isinstance(data, dict) and isinstance(data.get("glob"), str):
+        try:
+            items = iter_glob(BILAYERDATA_PATH, data["glob"])
+        except ValueError as e:
+            return api_return(error=str(e), status=400)
+    else:
+        return api_return(error="Expected a list of info dicts or {\"glob\": pattern}", status=400)
+
+    def stream():
+        for result in batch_validator.run(items, limit, structured):
+            yield json.dumps(result) + "\n"
+    return Response(stream_with_context(stream()), mimetype="application/x-ndjson")
+
+def validation_options(args) -> tuple:
+    """(limit, structured) from the query parameters of a validation request, ValueError if invalid."""
+    mode = args.get("errors", "text")
+    if mode not in ("text", "structured"):
+        raise ValueError("errors must be 'text' or 'structured'")
+    limit = VALIDATION_MAX_ERRORS
+    if "max_errors" in args:
+        try:
+            limit = min(int(args["max_errors"]), VALIDATION_MAX_ERRORS)
+        except ValueError:
+            raise ValueError("max_errors must be an integer") from None
+        if limit < 1:
+            raise ValueError("max_errors must be at least 1")
+    if args.get("fail_fast", "").lower() in ("1", "true", "yes"):
+        limit = 1
+    return limit, mode == "structured"
+
+def validate_payload(data: dict, limit: int = None, structured: bool = False) -> tuple:
+    """
+    Runs config and schema validation on an info dict.
+    Returns (error, cacheable) where error is None for a valid dict. Verdicts from a
+    crashing validator are not cacheable.
+    """
+    with stage("schema_validation"):
+        return check_info(data, parse_valid_config_settings, info_validator, logger, limit, structured)
 
 
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    """
+    GET /cache-stats - hit/miss counters of the validation cache, timings of the
+    last full and incremental mapping index builds, HTTP connection reuse, the
+    size of the served payloads per encoding and the mapping file content cache.
+    """
+    return api_return(payload={
+        "validation": validation_cache.stats(),
+        "mapping_index": mapping_index.timings,
+        "http": session_stats(),
+        "payload_bytes": payload_sizes(),
+        "mapping_contents": mapping_contents.stats(),
+    })
+
+
+def payload_sizes() -> dict:
+    """Bytes of each served payload per encoding, empty for payloads not built yet."""
+    sizes = {}
+    for name, payload in (("molecules", molecule_payload), ("mapping_files", mapping_payload)):
+        try:
+            sizes[name] = payload.sizes()
+        except FileNotFoundError:
+            sizes[name] = {}
+    return sizes
+
 @app.route('/health', methods=['GET'])
 def health_check():
+    """
+    GET /health - liveness, answers as soon as the app is imported.
+    """
     return api_return(payload={"status":"ok"})
 
+
+@app.route('/ready', methods=['GET'])
+def ready_check():
+    """
+    GET /ready - readiness, 503 until the Databank is loaded and the served files are built.
+    Includes the timing of each cold start step.
+    """
+    return api_return(payload=startup.to_dict(), status=200 if startup.ready else 503)
+
+
+def warm_up() -> bool:
+    """
+    Imports the Databank, syncs the repositories and builds the served files.
+    A failed pull is logged and the checked out revisions are used instead.
+    Only the first worker of a gunicorn start pulls and builds, the others reuse its files.
+    Returns whether the warm-up succeeded.
+    """
+    global built_heads
+    try:
+        imported_at = time.time()
+        with startup.step("import_databank"):
+            load_databank()
+        with shared_state.locked():
+            state = shared_state.published_this_boot()
+            if state is not None:
+                if state["updated"] > imported_at:
+                    # The other worker pulled after our import started
+                    with startup.step("molecules"):
+                        reload_databank_modules()
+                with startup.step("validator"):
+                    reload_validator()
+                    reset_validation_cache()
+                adopt_shared_files(state)
+            else:
+                with startup.step("pull"):
+                    try:
+                        heads = checked_out(pull_latest())
+                    except (subprocess.SubprocessError, OSError):
+                        logger.exception("Initial pull failed, continuing with checked out repositories")
+                        heads = {"BilayerData": repo_head(BILAYERDATA_PATH), "Databank": repo_head(DATABANK_PATH)}
+                with startup.step("validator"):
+                    reload_validator()
+                    reset_validation_cache()
+                with startup.step("molecules"):
+                    refresh_molecule_file(reload=False)
+                with startup.step("mappings"):
+                    build_mapping_dict(FMDL_MOL_PATH)
+                built_heads = heads
+                shared_state.publish(heads)
+    except Exception as e:
+        logger.exception("Warm-up failed")
+        startup.finish(error=str(e))
+        if STARTUP_MODE == "blocking":
+            raise
+        return False
+    startup.finish()
+    return True
+
+
+def warm_up_until_ready() -> None:
+    """
+    Background warm-up: retries a failed warm_up() with exponential backoff, so a
+    worker whose first attempt failed (e.g. the Databank checkout was broken or a
+    file system was not mounted yet) becomes ready once the cause is gone.
+    """
+    delay = WARM_UP_RETRY_BACKOFF
+    while not warm_up():
+        logger.warning("Retrying warm-up in %.0f s", delay)
+        time.sleep(delay)
+        delay = min(delay * 2, WARM_UP_RETRY_MAX)
+
+
+def adopt_shared_files(state: dict) -> None:
+    """Serve the files another worker has written and take over the revisions they were built from."""
+    global built_heads
+    logger.info("Using databank files of generation %d built by another worker", state["generation"])
+    molecule_payload.invalidate()
+    mapping_payload.invalidate()
+    mapping_index.invalidate()
+    mapping_contents.clear()
+    shared_state.generation = state["generation"]
+    built_heads = state["heads"]
+
+
+@app.before_request
+def sync_with_other_workers():
+    """Pick up refreshes that ran in another worker. Costs one stat() per request otherwise."""
+    if not startup.ready:
+        return
+    state = shared_state.poll()
+    if state is None:
+        return
+    reload_modules = state["heads"] != built_heads
+    adopt_shared_files(state)
+    if reload_modules:
+        sync_reload.request(state["generation"])
+
+def _reload_after_sync(generation: int) -> None:
+    logger.info("Reloading Databank for generation %d built by another worker", generation)
+    reload_databank_modules()
+    reload_validator()
+    reset_validation_cache()
+
+# Reloads the Databank after refreshes in other workers, one reload at a time
+sync_reload = CatchUpRunner(_reload_after_sync, name="sync-reload")
+
 # Initial setup, runs when gunicorn imports this app:
-pull_latest()
-refresh_molecule_file()
-build_mapping_dict(FMDL_MOL_PATH)
+startup.timings["app_import"] = round(time.perf_counter() - _import_started, 6)
+if STARTUP_MODE == "blocking":
+    warm_up()
+else:
+    threading.Thread(target=warm_up_until_ready, name="warm-up", daemon=True).start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=8000, debug=False)
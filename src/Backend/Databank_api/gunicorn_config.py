@@ -1,4 +1,29 @@
-workers = 1  
+import os
+import shutil
+import uuid
+
+# Workers write their metrics to files here and /metrics adds them up (prometheus_client multiprocess mode).
+# Set before prometheus_client is imported, the workers inherit it
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-databank-api")
+from prometheus_client import multiprocess  # noqa: E402
+
+# Concurrency, see README. Workers coordinate refreshes through files in LOCAL_STATIC.
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
 bind = "0.0.0.0:8000"
 # Gunicorn Configuration for Nginx
 
+
+def on_starting(server):
+    # Lets the workers tell a sibling's warm-up apart from one of an earlier gunicorn start
+    os.environ["BOOT_ID"] = uuid.uuid4().hex
+    # Metric files of an earlier gunicorn run would be added to the new values
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of the exited worker, its counters and histograms stay in the totals
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import yaml
+
+from mapping_index import MOLECULE_CATEGORIES
+
+
+def find_mapping_file(base_path: str, molecule: str, filename: str):
+    """
+    Return (category, path) of the mapping file filename of molecule below base_path,
+    or None if there is none. Only plain names are accepted and the resolved path
+    must stay inside base_path, so the arguments can't reach any other file.
+    """
+    for name in (molecule, filename):
+        if not name or name.startswith(".") or "/" in name or "\\" in name or "\0" in name:
+            return None
+    if "mapping" not in filename:
+        return None
+    base = os.path.realpath(base_path)
+    for category in MOLECULE_CATEGORIES:
+        path = os.path.realpath(os.path.join(base, category, molecule, filename))
+        if path.startswith(base + os.sep) and os.path.isfile(path):
+            return category, path
+    return None
+
+
+class MappingContentCache:
+    """
+    Parsed mapping files, serialized as JSON once per file version.
+
+    Files are parsed on first access. Entries are keyed by path, mtime and size, so
+    a file rewritten in place is parsed again, and the least recently used ones are
+    dropped once the cached bodies exceed `max_bytes`. clear() empties the cache
+    after a refresh.
+    """
+
+    def __init__(self, max_bytes: int = 32 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, path: str, meta: dict) -> tuple:
+        """
+        Return (body, etag) of the JSON document meta + {"mapping": parsed file}.
+        Raises OSError if the file can't be read and yaml.YAMLError if it can't be parsed.
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        with open(path, encoding="utf-8") as f:
+            mapping = yaml.safe_load(f)
+        body = json.dumps({**meta, "mapping": mapping}, separators=(",", ":"), default=str).encode("utf-8")
+        entry = (body, hashlib.sha256(body).hexdigest())
+
+        with self._lock:
+            self.misses += 1
+            if key not in self._entries:
+                self._entries[key] = entry
+                self.bytes += len(body)
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, (old_body, _) = self._entries.popitem(last=False)
+                self.bytes -= len(old_body)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = len(self._entries)
+        total = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else None,
+        }
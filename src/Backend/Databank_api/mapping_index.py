@@ -0,0 +1,138 @@
+import logging
+import os
+import subprocess
+import time
+
+logger = logging.getLogger('gunicorn.error')
+
+# Subfolders of FMDL_MOL_PATH holding one directory per molecule
+MOLECULE_CATEGORIES = ("membrane", "solution")
+
+
+class MappingIndex:
+    """
+    Index of mapping file names per molecule, as served from mapping-files.json.
+
+    rebuild() scans every molecule directory, update() rescans only the given molecules
+    and patches the previous index. The directory mtimes seen by the last scan are kept
+    so changes can be detected without git.
+    """
+
+    def __init__(self):
+        self.mappings = None
+        self.timings = {"full": None, "incremental": None}
+        self._dir_mtimes = {}
+
+    def invalidate(self) -> None:
+        """Forget the in-memory index, e.g. after another worker rewrote mapping-files.json."""
+        self.mappings = None
+        self._dir_mtimes = {}
+
+    def rebuild(self, base_path: str) -> dict:
+        """Scan all molecule directories below base_path."""
+        start = time.perf_counter()
+        mapping_dict = {}
+        dir_mtimes = {}
+        for category, entry in iter_molecule_dirs(base_path):
+            dir_mtimes[(category, entry.name)] = entry.stat().st_mtime_ns
+            files = list_mapping_files(entry.path)
+            if files:
+                mapping_dict.setdefault(entry.name, []).extend(files)
+        for mapping_list in mapping_dict.values():
+            mapping_list.sort()
+
+        self._dir_mtimes = dir_mtimes
+        self.mappings = dict(sorted(mapping_dict.items()))
+        self._record("full", start, len(dir_mtimes))
+        return self.mappings
+
+    def update(self, base_path: str, molecules: set, previous: dict) -> dict:
+        """Rescan only the named molecules and patch them into previous."""
+        start = time.perf_counter()
+        mapping_dict = dict(previous)
+        for molecule in molecules:
+            files = []
+            for category in MOLECULE_CATEGORIES:
+                mol_dir = os.path.join(base_path, category, molecule)
+                try:
+                    self._dir_mtimes[(category, molecule)] = os.stat(mol_dir).st_mtime_ns
+                except FileNotFoundError:
+                    self._dir_mtimes.pop((category, molecule), None)
+                    continue
+                files.extend(list_mapping_files(mol_dir))
+            if files:
+                mapping_dict[molecule] = sorted(files)
+            else:
+                mapping_dict.pop(molecule, None)
+
+        self.mappings = dict(sorted(mapping_dict.items()))
+        self._record("incremental", start, len(molecules))
+        return self.mappings
+
+    def changed_molecules(self, base_path: str, repo_path: str, before, after):
+        """
+        Return the names of molecules whose directories changed between two commits of
+        the repo at repo_path, falling back to directory mtimes when git can't tell.
+        Returns None when neither is possible and a full rebuild is needed.
+        """
+        if before and after:
+            if before == after:
+                return set()
+            changed = self._changed_by_git(base_path, repo_path, before, after)
+            if changed is not None:
+                return changed
+        return self._changed_by_mtime(base_path)
+
+    def _changed_by_git(self, base_path, repo_path, before, after):
+        prefix = os.path.relpath(base_path, repo_path)
+        if prefix.startswith(".."):
+            return None
+        try:
+            result = subprocess.run(
+                ["git", "diff", "--name-only", "--no-renames", f"{before}..{after}", "--", prefix],
+                cwd=repo_path, capture_output=True, text=True, check=True,
+            )
+        except (subprocess.CalledProcessError, OSError) as e:
+            logger.warning("git diff failed in %s, falling back to mtimes: %s", repo_path, e)
+            return None
+
+        changed = set()
+        for line in result.stdout.splitlines():
+            parts = os.path.relpath(line, prefix).split(os.sep)
+            # <category>/<molecule>/<file>
+            if len(parts) >= 3 and parts[0] in MOLECULE_CATEGORIES:
+                changed.add(parts[1])
+        return changed
+
+    def _changed_by_mtime(self, base_path):
+        if not self._dir_mtimes:
+            return None
+        seen = set()
+        changed = set()
+        for category, entry in iter_molecule_dirs(base_path):
+            key = (category, entry.name)
+            seen.add(key)
+            if self._dir_mtimes.get(key) != entry.stat().st_mtime_ns:
+                changed.add(entry.name)
+        changed.update(molecule for _, molecule in self._dir_mtimes.keys() - seen)
+        return changed
+
+    def _record(self, mode: str, start: float, scanned: int) -> None:
+        seconds = time.perf_counter() - start
+        self.timings[mode] = {"seconds": round(seconds, 6), "molecules_scanned": scanned}
+        logger.info("%s mapping index build scanned %d molecule(s) in %.3f s",
+                    mode.capitalize(), scanned, seconds)
+
+
+def iter_molecule_dirs(base_path: str):
+    """Yield (category, os.DirEntry) for every molecule directory below base_path."""
+    for category in MOLECULE_CATEGORIES:
+        with os.scandir(os.path.join(base_path, category)) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    yield category, entry
+
+
+def list_mapping_files(mol_dir: str) -> list:
+    with os.scandir(mol_dir) as entries:
+        return [entry.name for entry in entries if "mapping" in entry.name]
@@ -0,0 +1,91 @@
+import bisect
+import threading
+from collections import Counter
+
+# Minimum share of n-grams a name must have in common with the query to count as a fuzzy match
+MIN_SIMILARITY = 0.2
+
+
+def ngrams(text: str, n: int = 3) -> set:
+    """Character n-grams of text, padded so that short names and word edges get n-grams too."""
+    padded = f"{'$' * (n - 1)}{text}{'$' * (n - 1)}"
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+class MoleculeSearch:
+    """
+    Prefix and fuzzy lookup of molecule names, built from the molecules.json payload.
+
+    Names are kept lower-cased in a sorted list, so prefix matches are found with a
+    binary search. A posting list per 3-gram finds fuzzy matches by the Jaccard
+    similarity of the n-gram sets, looking only at names sharing an n-gram with the
+    query. sync() rebuilds the index whenever the payload's ETag changes, and the
+    index is swapped as a whole so searches never see a half-built one.
+    """
+
+    def __init__(self):
+        self.etag = None
+        # (sorted lower-case keys, [(name, type)] in key order, {ngram: [positions]}, [ngram count])
+        self._index = ([], [], {}, [])
+        self._lock = threading.Lock()
+
+    def sync(self, payload) -> None:
+        """Rebuild from payload (a PayloadCache of molecules.json) if it changed since the last build."""
+        molecules, etag = payload.data()
+        if etag == self.etag:
+            return
+        with self._lock:
+            if etag != self.etag:
+                self._index = self._build(molecules)
+                self.etag = etag
+
+    @staticmethod
+    def _build(molecules: dict) -> tuple:
+        entries = sorted(
+            [(name.lower(), name, "lipid") for name in molecules.get("lipids", [])] +
+            [(name.lower(), name, "solution") for name in molecules.get("solution", [])]
+        )
+        keys = [key for key, _, _ in entries]
+        names = [(name, kind) for _, name, kind in entries]
+        postings = {}
+        sizes = []
+        for position, key in enumerate(keys):
+            grams = ngrams(key)
+            sizes.append(len(grams))
+            for gram in grams:
+                postings.setdefault(gram, []).append(position)
+        return keys, names, postings, sizes
+
+    def search(self, query: str) -> list:
+        """
+        Return [{"name", "type", "match", "score"}] for query: prefix matches in name
+        order first, then fuzzy matches by decreasing similarity.
+        """
+        keys, names, postings, sizes = self._index
+        query = query.strip().lower()
+        results = []
+        prefix_positions = set()
+
+        start = bisect.bisect_left(keys, query)
+        for position in range(start, len(keys)):
+            if not keys[position].startswith(query):
+                break
+            prefix_positions.add(position)
+            name, kind = names[position]
+            results.append({"name": name, "type": kind, "match": "prefix", "score": 1.0})
+
+        query_grams = ngrams(query)
+        shared = Counter()
+        for gram in query_grams:
+            shared.update(postings.get(gram, ()))
+        fuzzy = []
+        for position, common in shared.items():
+            if position in prefix_positions:
+                continue
+            score = common / (len(query_grams) + sizes[position] - common)
+            if score >= MIN_SIMILARITY:
+                fuzzy.append((-score, keys[position], position))
+        for negative_score, _, position in sorted(fuzzy):
+            name, kind = names[position]
+            results.append({"name": name, "type": kind, "match": "fuzzy", "score": round(-negative_score, 3)})
+        return results
@@ -0,0 +1,143 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # Without brotli only gzip variants are written
+    brotli = None
+
+# Clients may keep a copy but must revalidate it; with the ETag that costs an empty 304.
+CACHE_CONTROL = os.getenv("PAYLOAD_CACHE_CONTROL", "public, no-cache")
+# Compressed variants kept of every payload, in order of preference, and their file suffixes
+ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress body at the highest level, it is done once per refresh and not per request."""
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.decompress(data)
+    return gzip.decompress(data)
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class PayloadCache:
+    """
+    Keeps the serialized JSON body of a static file (molecules.json, mapping-files.json)
+    in process memory together with a content-hash ETag.
+
+    The body is minified and written with gzip (and brotli, when installed) variants
+    next to it, so responses pick a representation from Accept-Encoding without
+    compressing anything at request time. The (body, etag, variants) entry is
+    replaced as a whole whenever the file is rewritten, so readers always see a
+    consistent snapshot without taking a lock.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entry = None
+        self._parsed = (None, None)
+        self._lock = threading.Lock()
+
+    def store(self, obj) -> None:
+        """Serialize and compress obj, write it atomically to disk and swap in the new in-memory entry."""
+        body = json.dumps(obj, separators=(",", ":")).encode("utf-8")
+        variants = {encoding: compress(body, encoding) for encoding in ENCODINGS}
+        _write_atomic(self.path, body)
+        for encoding, data in variants.items():
+            _write_atomic(self.path + SUFFIXES[encoding], data)
+        self._entry = _make_entry(body, variants)
+
+    def invalidate(self) -> None:
+        """Forget the in-memory copy, e.g. after another worker rewrote the file."""
+        self._entry = None
+
+    def _current(self) -> tuple:
+        entry = self._entry
+        if entry is None:
+            with self._lock:
+                if self._entry is None:
+                    self._entry = self._load()
+                entry = self._entry
+        return entry
+
+    def _load(self) -> tuple:
+        """Read the persisted file and its variants, recompressing any that are missing or stale."""
+        with open(self.path, "rb") as f:
+            body = f.read()
+        variants = {}
+        for encoding in ENCODINGS:
+            try:
+                with open(self.path + SUFFIXES[encoding], "rb") as f:
+                    data = f.read()
+                if decompress(data, encoding) == body:
+                    variants[encoding] = data
+                    continue
+            except Exception:
+                # Missing or damaged variant file, compressed again below
+                pass
+            variants[encoding] = compress(body, encoding)
+        return _make_entry(body, variants)
+
+    def get(self) -> tuple:
+        """
+        Return (body, etag). Loads the persisted file on first use,
+        raises FileNotFoundError if it has never been written.
+        """
+        body, etag, _ = self._current()
+        return body, etag
+
+    def data(self) -> tuple:
+        """Return (obj, etag) with the body parsed, parsing it once per new entry."""
+        body, etag = self.get()
+        parsed_etag, obj = self._parsed
+        if parsed_etag != etag:
+            obj = json.loads(body)
+            self._parsed = (etag, obj)
+        return obj, etag
+
+    def sizes(self) -> dict:
+        """Bytes of the body and of each compressed variant."""
+        body, _, variants = self._current()
+        return {"identity": len(body), **{encoding: len(data) for encoding, data in variants.items()}}
+
+    def respond(self) -> Response:
+        """
+        Build the response for the current request in the best encoding the client accepts,
+        answering 304 when the client copy is current. Each encoding has its own ETag.
+        """
+        body, etag, variants = self._current()
+        encoding = request.accept_encodings.best_match(variants)
+        if encoding is not None:
+            body, etag = variants[encoding], f"{etag}-{encoding}"
+        if request.if_none_match.contains(etag):
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype="application/json")
+            if encoding is not None:
+                resp.headers["Content-Encoding"] = encoding
+        resp.set_etag(etag)
+        resp.headers["Cache-Control"] = CACHE_CONTROL
+        resp.vary.add("Accept-Encoding")
+        return resp
+
+
+def _make_entry(body: bytes, variants: dict) -> tuple:
+    return body, hashlib.sha256(body).hexdigest(), variants
@@ -0,0 +1,170 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from tracing import span
+
+logger = logging.getLogger('gunicorn.error')
+
+# Phases of a databank refresh, in the order they run
+PHASES = ("pull", "molecules", "mappings")
+
+
+class RefreshJob:
+    """Progress of one background databank refresh."""
+
+    def __init__(self, on_change=None):
+        self.id = uuid.uuid4().hex
+        self.state = "queued"
+        self.phases = {name: "pending" for name in PHASES}
+        self.error = None
+        self.heads = None
+        self.created = time.time()
+        self.finished = None
+        self._on_change = on_change
+
+    def changed(self) -> None:
+        if self._on_change is not None:
+            self._on_change(self)
+
+    @contextmanager
+    def phase(self, name: str, error_message: str):
+        """Mark phase name as running, then done or failed with error_message."""
+        self.phases[name] = "running"
+        self.changed()
+        try:
+            yield
+        except Exception:
+            logger.exception("Refresh phase '%s' failed", name)
+            self.phases[name] = "failed"
+            self.error = error_message
+            self.changed()
+            raise
+        self.phases[name] = "done"
+        self.changed()
+
+    def skip(self, name: str) -> None:
+        self.phases[name] = "skipped"
+        self.changed()
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "phases": dict(self.phases),
+            "error": self.error,
+            "heads": self.heads,
+            "created": self.created,
+            "finished": self.finished,
+        }
+
+
+class RefreshJobRunner:
+    """
+    Runs refreshes in a background thread, one at a time across all gunicorn workers.
+
+    The run holds the shared inter-process lock, so submitting while a refresh is in
+    flight in any worker returns that job instead of starting another one. Job progress
+    is written to jobs_dir so every worker can answer status lookups; the last `history`
+    jobs are kept.
+    """
+
+    def __init__(self, target, shared, jobs_dir: str, history: int = 20):
+        self._target = target
+        self._shared = shared
+        self._jobs_dir = jobs_dir
+        self._history = history
+        self._current = None
+        self._lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def submit(self) -> tuple:
+        """
+        Return (job status, created) where created is False if an earlier job was still
+        running. The status is None when the lock is held by something other than a
+        refresh job, e.g. the warm-up of another worker.
+        """
+        with self._lock:
+            if self._current is not None:
+                return self._current.to_dict(), False
+            handle = self._shared.acquire(blocking=False)
+            if handle is None:
+                return self._running_elsewhere(), False
+            job = RefreshJob(on_change=self._save)
+            self._current = job
+            self._save(job)
+        self._prune()
+
+        # Started in a copy of the caller's context, so the job continues the submitting request's trace
+        threading.Thread(target=contextvars.copy_context().run, args=(self._run, job, handle),
+                         name=f"refresh-{job.id}", daemon=True).start()
+        return job.to_dict(), True
+
+    def get(self, job_id: str):
+        """Return the status dict of job_id, or None if it is unknown."""
+        if not re.fullmatch(r"[0-9a-f]{32}", job_id):
+            return None
+        try:
+            with open(self._path(job_id), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def _run(self, job: RefreshJob, handle) -> None:
+        job.state = "running"
+        job.changed()
+        try:
+            with span("refresh_job", job=job.id):
+                self._target(job)
+            job.state = "succeeded"
+        except Exception:
+            job.state = "failed"
+            if job.error is None:
+                logger.exception("Refresh job %s crashed", job.id)
+                job.error = "Refresh failed"
+        finally:
+            job.finished = time.time()
+            job.changed()
+            self._shared.release(handle)
+            with self._lock:
+                self._current = None
+            logger.info("Refresh job %s finished: %s", job.id, job.state)
+
+    def _path(self, job_id: str) -> str:
+        return os.path.join(self._jobs_dir, f"{job_id}.json")
+
+    def _save(self, job: RefreshJob) -> None:
+        tmp_path = self._path(job.id) + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job.to_dict(), f)
+        os.replace(tmp_path, self._path(job.id))
+
+    def _saved_jobs(self) -> list:
+        """Paths of saved jobs, oldest first."""
+        with os.scandir(self._jobs_dir) as entries:
+            jobs = [entry for entry in entries if entry.name.endswith(".json")]
+        return [entry.path for entry in sorted(jobs, key=lambda entry: entry.stat().st_mtime_ns)]
+
+    def _running_elsewhere(self):
+        for path in reversed(self._saved_jobs()):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    status = json.load(f)
+            except FileNotFoundError:
+                continue
+            if status["state"] in ("queued", "running"):
+                return status
+        return None
+
+    def _prune(self) -> None:
+        for path in self._saved_jobs()[:-self._history]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,183 @@
+import importlib
+import json
+import logging
+import os
+import threading
+from datetime import date
+
+import yaml
+from jsonschema import Draft7Validator, FormatChecker
+
+logger = logging.getLogger('gunicorn.error')
+
+UPSTREAM_MODULE = "fairmd.lipids.schema_validation.validate_yaml"
+# Filled-in example shipped next to the Databank's info schema
+TEMPLATE_NAME = "info_template.yaml"
+
+
+class InfoSchemaValidator:
+    """
+    Validates info.yml dicts like the Databank's validate_info_dict, which loads and
+    compiles the schema on every call, with a validator compiled once per reload().
+
+    The validator is built the way validate_info_dict builds it and its errors pass
+    the same date filter. reload() then runs both on probe documents (an empty dict,
+    the Databank's info template and broken variants of it); if they disagree, e.g.
+    because the Databank changed how it validates, every call is handed to
+    validate_info_dict until the next reload. reload() must be called again after
+    the Databank repo has been pulled so a changed schema is picked up.
+    """
+
+    def __init__(self, upstream=None):
+        # The Databank's validate_yaml module, imported by reload() unless given
+        self._upstream = upstream
+        self._imported = False
+        self._validator = None
+        self._filter = None
+        self.delegating = False
+        self._lock = threading.Lock()
+
+    def reload(self) -> None:
+        """(Re)build the validator from the schema shipped with the installed Databank."""
+        with self._lock:
+            if self._upstream is None:
+                self._upstream = importlib.import_module(UPSTREAM_MODULE)
+                self._imported = True
+            elif self._imported:
+                self._upstream = importlib.reload(self._upstream)
+            upstream = self._upstream
+            schema_path = upstream.default_info_schema_path
+            validator = build_info_validator(schema_path)
+            date_filter = getattr(upstream, "_filter_yaml_date_string_type_errors", None)
+            if date_filter is None:
+                mismatch = "validate_yaml has no date error filter"
+            else:
+                mismatch = find_mismatch(validator, date_filter, upstream.validate_info_dict,
+                                         probe_documents(schema_path))
+            if mismatch is not None:
+                logger.error("Precompiled info schema validator disagrees with validate_info_dict (%s), "
+                             "validating with validate_info_dict until the next reload", mismatch)
+            self._validator, self._filter, self.delegating = validator, date_filter, mismatch is not None
+
+    def validate(self, instance: dict, limit: int = None) -> list:
+        """
+        Return a list of jsonschema.ValidationError objects, empty when instance is valid.
+        With limit, validation stops as soon as that many errors were found.
+        """
+        if self._validator is None:
+            self.reload()
+        if self.delegating:
+            errors = self._upstream.validate_info_dict(instance)
+            return errors if limit is None else errors[:limit]
+        validator, date_filter = self._validator, self._filter
+        if limit is None:
+            return date_filter(list(validator.iter_errors(instance)))
+
+        errors = []
+        # iter_errors is lazy, so stopping early skips the rest of the document
+        for error in validator.iter_errors(instance):
+            errors.extend(date_filter([error]))
+            if len(errors) >= limit:
+                break
+        return errors
+
+
+def build_info_validator(schema_path: str) -> Draft7Validator:
+    """Load and check the schema at schema_path and return a ready-to-use validator."""
+    with open(schema_path, encoding="utf-8") as f:
+        schema = json.load(f)
+    Draft7Validator.check_schema(schema)
+    validator = Draft7Validator(schema, format_checker=FormatChecker())
+    # One pass over an empty document resolves $refs and format checkers before the first request
+    list(validator.iter_errors({}))
+    return validator
+
+
+def probe_documents(schema_path: str) -> list:
+    """Documents both validators must agree on: {} plus the Databank's template and broken variants of it."""
+    probes = [{}]
+    try:
+        with open(os.path.join(os.path.dirname(schema_path), TEMPLATE_NAME), encoding="utf-8") as f:
+            template = yaml.safe_load(f)
+    except (OSError, yaml.YAMLError):
+        return probes
+    if not isinstance(template, dict) or not template:
+        return probes
+    first_key = next(iter(template))
+    probes += [
+        template,
+        {**template, "DATE": date(2021, 2, 23)},
+        {**template, "TEMPERATURE": "hot", "PREEQTIME": -1},
+        {**template, "NOT_AN_INFO_FIELD": 1},
+        {key: value for key, value in template.items() if key != first_key},
+    ]
+    return probes
+
+
+def error_key(error) -> tuple:
+    return tuple(str(p) for p in error.path), error.message, error.validator
+
+
+def find_mismatch(validator, date_filter, validate_info_dict, probes: list):
+    """None if validator (with date_filter) reports the same errors as validate_info_dict for every probe."""
+    for i, probe in enumerate(probes):
+        ours = sorted(error_key(e) for e in date_filter(list(validator.iter_errors(probe))))
+        theirs = sorted(error_key(e) for e in validate_info_dict(probe))
+        if ours != theirs:
+            return f"probe {i}: {len(ours)} error(s) against {len(theirs)}"
+    return None
+
+
+def check_info(data: dict, parse_valid_config_settings, validator: InfoSchemaValidator, log: logging.Logger,
+               limit: int = None, structured: bool = False) -> tuple:
+    """
+    Runs the Databank config check and the schema validation on an info dict.
+    Returns (error, cacheable) where error is None for a valid dict. Verdicts from a
+    crashing validator are not cacheable.
+
+    At most limit schema errors are collected; the text notes when there were more.
+    error is a text with one line per error, or with structured a list of
+    {path, message, validator} dicts.
+    """
+    try:
+        parse_valid_config_settings(data, log)
+    except Exception as e:
+        log.error("Validation failed: %s", e)
+        if structured:
+            return [{"path": "<root>", "message": str(e), "validator": "config"}], True
+        return str(e), True
+    try:
+        log.info("Validating info file by schema")
+        # One error more than the limit tells whether validation was cut short
+        errors = validator.validate(data, None if limit is None else limit + 1)
+        truncated = limit is not None and len(errors) > limit
+        if truncated:
+            errors = errors[:limit]
+        if errors:
+            msg = format_schema_errors(errors)
+            log.error("Schema validation failed:\n%s", msg)
+            if truncated:
+                msg += f"\n(validation stopped after {limit} error(s))"
+            return (structure_schema_errors(errors) if structured else msg), True
+
+        log.info("No errors found in info file by schema")
+
+    except Exception as e:
+        log.error("Schema validation crashed: %s", e)
+        if structured:
+            return [{"path": "<root>", "message": str(e), "validator": "crash"}], False
+        return str(e), False
+
+    return None, True
+
+
+def error_path(error) -> str:
+    return ".".join(str(p) for p in error.path) if error.path else "<root>"
+
+
+def format_schema_errors(errors) -> str:
+    return "\n".join(f"{error_path(e)}: {e.message}" for e in errors)
+
+
+def structure_schema_errors(errors) -> list:
+    return [{"path": error_path(e), "message": e.message, "validator": e.validator} for e in errors]
@@ -0,0 +1,147 @@
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('gunicorn.error')
+
+# Set by gunicorn_config.on_starting, shared by all workers of one gunicorn start
+BOOT_ID = os.getenv("BOOT_ID") or str(os.getpid())
+
+
+class SharedState:
+    """
+    Coordinates the gunicorn workers of the Databank API through files in a shared folder.
+
+    An flock'ed lock file makes sure only one worker at a time pulls the repositories
+    and rewrites the served files. A state file records a generation counter and the
+    commit SHAs the files were built from; workers poll it to pick up refreshes that
+    ran in another worker.
+    """
+
+    def __init__(self, directory: str):
+        self.lock_path = os.path.join(directory, "databank.lock")
+        self.state_path = os.path.join(directory, "databank-state.json")
+        self.generation = 0
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def acquire(self, blocking: bool = True):
+        """Take the inter-process lock. Returns a handle for release(), or None if it is held elsewhere."""
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    def release(self, handle) -> None:
+        os.close(handle)
+
+    @contextmanager
+    def locked(self):
+        handle = self.acquire()
+        try:
+            yield
+        finally:
+            self.release(handle)
+
+    def read(self):
+        """Return the current shared state, or None if no worker has published one yet."""
+        try:
+            with open(self.state_path, encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def publish(self, heads: dict) -> int:
+        """Record that the served files were rebuilt from heads. Call with the lock held."""
+        state = self.read() or {}
+        generation = state.get("generation", 0) + 1
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "generation": generation,
+                "heads": heads,
+                "boot": BOOT_ID,
+                "updated": time.time(),
+            }, f)
+        os.replace(tmp_path, self.state_path)
+        with self._lock:
+            self.generation = generation
+        return generation
+
+    def published_this_boot(self):
+        """The shared state if a sibling worker already pulled and built the files since gunicorn started."""
+        state = self.read()
+        if state is not None and state.get("boot") == BOOT_ID:
+            return state
+        return None
+
+    def poll(self):
+        """
+        Return the shared state if another worker published a newer generation since the
+        last call, otherwise None. Costs a single stat() when nothing changed.
+        """
+        try:
+            mtime = os.stat(self.state_path).st_mtime_ns
+        except FileNotFoundError:
+            return None
+        if mtime == self._mtime:
+            return None
+        with self._lock:
+            self._mtime = mtime
+            state = self.read()
+            if state is None or state["generation"] <= self.generation:
+                return None
+            self.generation = state["generation"]
+            return state
+
+
+class CatchUpRunner:
+    """
+    Runs func(generation) in a background thread, one run at a time, until it has run
+    for the latest generation passed to request(). A request made while a run is going
+    on is not dropped: the thread runs again for it once the current run finished.
+    """
+
+    def __init__(self, func, name: str = "catch-up"):
+        self._func = func
+        self._name = name
+        self._wanted = 0
+        self._running = False
+        self._lock = threading.Lock()
+        self.runs = 0
+
+    def request(self, generation: int) -> bool:
+        """Ask for a run for generation. Returns whether a thread was started for it."""
+        with self._lock:
+            self._wanted = max(self._wanted, generation)
+            if self._running:
+                return False
+            self._running = True
+        threading.Thread(target=self._loop, name=self._name, daemon=True).start()
+        return True
+
+    def _loop(self) -> None:
+        while True:
+            with self._lock:
+                target = self._wanted
+            try:
+                self._func(target)
+            except Exception:
+                logger.exception("%s for generation %d failed", self._name, target)
+            with self._lock:
+                self.runs += 1
+                if self._wanted == target:
+                    self._running = False
+                    return
+
+    @property
+    def running(self) -> bool:
+        with self._lock:
+            return self._running
@@ -0,0 +1,39 @@
+import logging
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger('gunicorn.error')
+
+
+class StartupState:
+    """
+    Tracks the warm-up of the Databank API: which steps have run, how long each one
+    took and whether the service is ready to validate and refresh.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.ready = False
+        self.error = None
+        self.attempts = 0
+        self.timings = {}
+
+    @contextmanager
+    def step(self, name: str):
+        """Time the wrapped block and record it under name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = round(time.perf_counter() - start, 6)
+            logger.info("Startup step '%s' took %.3f s", name, self.timings[name])
+
+    def finish(self, error=None) -> None:
+        self.attempts += 1
+        self.error = error
+        self.ready = error is None
+        self.timings["total"] = round(time.perf_counter() - self.started, 6)
+        logger.info("Startup finished in %.3f s, ready=%s", self.timings["total"], self.ready)
+
+    def to_dict(self) -> dict:
+        return {"ready": self.ready, "error": self.error, "attempts": self.attempts, "timings": dict(self.timings)}
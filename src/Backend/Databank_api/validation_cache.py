@@ -0,0 +1,60 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+class ValidationCache:
+    """
+    Bounded LRU cache of /info-valid-check verdicts.
+
+    Keys are a hash of the canonical (sorted-key) JSON of the info dict together with
+    the revision of the repositories the validation code and molecule lists come from,
+    so a verdict is only reused while the same schema and molecules are loaded.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self.revision = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, info_dict: dict, variant: str = "") -> str:
+        """Cache key of info_dict. variant tells apart verdicts reported in different forms."""
+        canonical = json.dumps(info_dict, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(f"{self.revision}\n{variant}\n{canonical}".encode("utf-8")).hexdigest()
+
+    def lookup(self, key: str) -> tuple:
+        """Return (hit, error). error is None for a payload that was found valid."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return True, self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def store(self, key: str, error) -> None:
+        with self._lock:
+            self._entries[key] = error
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def reset(self, revision=None) -> None:
+        """Drop all verdicts, e.g. after new schema or molecule data has been pulled."""
+        with self._lock:
+            self._entries.clear()
+            self.revision = revision
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "revision": self.revision,
+            }
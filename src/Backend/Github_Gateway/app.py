@@ -1,26 +1,59 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request
 from flask_cors import CORS
 import os
+import re
+import time
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 import utils
 import requests 
 from requests.auth import HTTPBasicAuth
 from github import Github, GithubException
 import logging
 from api_return_standard import api_return
+from http_session import session_stats
+from prometheus_client import Counter, Gauge
+from metrics import instrument_app, sampled
+from tracing import instrument_tracing, current_traceparent
+from upload_jobs import UploadQueue, UploadWorkerPool, IdempotencyConflict
+from github_requests import RateLimitExhausted
+from fan_out import run_until_failure
 
 app = Flask(__name__)
 CORS(app)
+instrument_app(app)
 logger = logging.getLogger('gunicorn.error')
 logger.setLevel(logging.INFO)
+instrument_tracing(app, "github_gateway")
 
 #Constants
 
 #Oauth-app credentials for nmrlipids-user-authenticator 
 OAUTH_ID =  os.getenv("OAUTH_ID")
 OAUTH_SECRET = os.getenv("OAUTH_SECRET")
-gh = Github()
+gh = Github(base_url=utils.GITHUB_API_URL)
 oauth_app = gh.get_oauth_application(OAUTH_ID, OAUTH_SECRET)
 
+#Upload queue settings
+UPLOAD_QUEUE_DB = os.getenv("UPLOAD_QUEUE_DB", os.path.join(os.path.dirname(__file__), "data", "upload_jobs.sqlite3"))
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "3"))
+UPLOAD_RETRY_BACKOFF = float(os.getenv("UPLOAD_RETRY_BACKOFF", "2"))
+#Seconds during which a repeated upload (same content or Idempotency-Key) returns the earlier job
+UPLOAD_DEDUP_WINDOW = float(os.getenv("UPLOAD_DEDUP_WINDOW", "86400"))
+#GitHub steps of an upload, in the order they run
+UPLOAD_STAGES = ("sync", "commit", "pull_request")
+#Extra files an upload may add next to info.yml, e.g. README.md or mapping files
+EXTRA_FILE_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,99}$")
+MAX_EXTRA_FILES = 10
+#Seconds the token check, user lookup and validation of an upload may take together, and threads running them
+UPLOAD_CHECK_TIMEOUT = float(os.getenv("UPLOAD_CHECK_TIMEOUT", "15"))
+UPLOAD_CHECK_WORKERS = int(os.getenv("UPLOAD_CHECK_WORKERS", "16"))
+
+#Runs the independent checks of an upload concurrently
+upload_checks = ThreadPoolExecutor(max_workers=UPLOAD_CHECK_WORKERS, thread_name_prefix="upload-check")
+
 
 
 @app.route('/awake', methods=['GET'])
@@ -28,6 +61,41 @@ def awake():
     return "<h1> Server is awake!<h1>"
 
 
+@app.route('/token-stats', methods=['GET'])
+def token_stats():
+    """
+    #Mint counts and latencies of the cached installation tokens, identity cache and upstream sync counters,
+    #GitHub quota per installation, conditional request hits, the branch list cache
+    #and connection reuse of the pooled HTTP sessions
+    """
+    return api_return(payload={
+        "tokens": utils.token_manager.stats(),
+        "identity_cache": utils.identity_cache.stats(),
+        "upstream_sync": utils.upstream_sync.stats(),
+        "rate_limits": utils.rate_limits.stats(),
+        "conditional_cache": utils.conditional_cache.stats(),
+        "branches": utils.branch_cache.stats(),
+        "http": session_stats(),
+    })
+
+
+@app.route('/branches', methods=['GET'])
+def list_branches():
+    """
+    #Branch names of the data repository from the server-side cache, with an ETag for cheap revalidation
+    """
+    try:
+        body, etag = utils.branch_cache.get()
+    except (GithubException, requests.RequestException, RateLimitExhausted) as e:
+        logger.error("Failed to list branches: %s", e)
+        return api_return(error="Failed to list branches", status=502)
+
+    resp = Response(status=304) if request.if_none_match.contains(etag) else Response(body, mimetype="application/json")
+    resp.set_etag(etag)
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp
+
+
 @app.route('/verifyCode', methods=['POST'])
 def verify_code():
     """
@@ -44,11 +112,12 @@ def verify_code():
 
     try:
         access_token = oauth_app.get_access_token(code).token
-        user_gh = Github(login_or_token=access_token)
-        username = user_gh.get_user().login
-    except GithubException as e:
+        username = utils.get_user_login(access_token)
+    except (GithubException, requests.RequestException) as e:
         logger.error("OAuth exchange or user fetch failed: %s", e)
         return api_return(error="GitHub OAuth exchange failed", status=502)
+    if username is None:
+        return api_return(error="GitHub OAuth exchange failed", status=502)
 
     try:
         admin_status = utils.user_has_push_access(access_token)
@@ -84,16 +153,29 @@ def user_admin_check():
     return api_return(payload={"authorized": True})
 
 
-def authorizeToken(access_token):
+@app.route('/logout', methods=['POST'])
+def logout():
+    """
+    #Forgets cached identity lookups for the user's token
+    """
+    auth = request.headers.get('Authorization','')
+    if not auth.startswith('Bearer '):
+        return api_return(error="Missing token", status=401)
+    utils.forget_user(auth.split()[1])
+    return api_return(payload={"loggedOut": True})
+
+
+@utils.timed_call("github", "authorize_token")
+def authorizeToken(access_token, timeout=8):
     """
     #Method for checking validity of user token. 
     """
-    url = f"https://api.github.com/applications/{OAUTH_ID}/token"
+    url = f"{utils.GITHUB_API_URL}/applications/{OAUTH_ID}/token"
     headers = {"Accept": "application/vnd.github+json"}
     data = {"access_token": access_token}
 
     try:
-        response = requests.post(url, auth=HTTPBasicAuth(OAUTH_ID, OAUTH_SECRET), headers=headers, json=data, timeout=8)
+        response = utils.github_session.post(url, auth=HTTPBasicAuth(OAUTH_ID, OAUTH_SECRET), headers=headers, json=data, timeout=timeout)
         if response.status_code == 200:
             return response.json(), None, 200
         elif response.status_code == 404:
@@ -115,49 +197,160 @@ def upload_file():
 
     if not token:
         return api_return(error="Missing or malformed Authorization header", status=400)
-
-    response, error, err_code = authorizeToken(token)
-    if error:
-        return api_return(error=error, status=err_code)
     if not request.is_json:
         return api_return(error="Content-Type must be application/json", status=400)
     
     data = request.get_json()
     if data is None:
         return api_return(error="Malformed or empty JSON body", status=400)
-    
-    try:
-        gh_user = Github(login_or_token=token).get_user()
-        gh_user_name = gh_user.login
-    except GithubException:
-        logger.exception("Failed to fetch GitHub username from token")
-        return api_return(error="Failed to verify GitHub user", status=502)
 
     user_name   = data.pop('userName', None)
     base_branch = data.pop('branch',   None)
+    extra_files = data.pop('extraFiles', None) or {}
     if not user_name or not base_branch:
         return api_return(error="Missing userName or branch in JSON", status=400)
+    if not valid_extra_files(extra_files):
+        return api_return(error=f"extraFiles must map up to {MAX_EXTRA_FILES} plain file names (not info.yml) to text", status=400)
 
-    errors = utils.is_input_invalid(data)
-    if errors:
-        return api_return(error=errors, status=400)
+    #Token check, user lookup and validation don't depend on each other, run them at once
+    deadline = time.monotonic() + UPLOAD_CHECK_TIMEOUT
+    remaining = lambda: max(deadline - time.monotonic(), 0.1)
+    results, failure = run_until_failure(upload_checks, {
+        "token": lambda: authorizeToken(token, timeout=remaining()),
+        "login": lambda: utils.get_user_login(token, timeout=remaining()),
+        "validation": lambda: utils.is_input_invalid(data, timeout=remaining()),
+    }, upload_check_failed, UPLOAD_CHECK_TIMEOUT)
+    if failure:
+        return upload_check_response(token, *failure)
+    gh_user_name = results["login"]
 
-    try: 
-        commit_branch = utils.push_info_file(data, user_name)
-        url = utils.create_pull_request_to_target(
-            head_branch=commit_branch,
-            title=f"Upload Portal: Simulation files from {user_name}",
-            body=f"""\
+    payload = {
+        "data": data,
+        "extraFiles": extra_files,
+        "userName": user_name,
+        "title": f"Upload Portal: Simulation files from {user_name}",
+        "body": f"""\
 This PR contains simulation files uploaded by @{gh_user_name} through the NMRlipids upload portal.
 
 Processing of simulation data will happen after approval.
+    """,
+    }
+    dedup_key, content_hash = upload_keys(gh_user_name, request.headers.get('Idempotency-Key'), payload)
+    #Not part of the content hash: the worker continues this request's trace
+    payload["traceparent"] = current_traceparent()
+    try:
+        job_id, created = upload_queue.enqueue(payload, dedup_key, content_hash)
+    except IdempotencyConflict as e:
+        return api_return(error=str(e), status=422)
+
+    if not created:
+        #Repeated submission, answer with the earlier job and its pull request, no GitHub writes
+        logger.info(f"Upload from {gh_user_name} repeats upload job {job_id}")
+        status = upload_queue.status(job_id)
+        if status["state"] == "succeeded":
+            return api_return(payload={"message": "Already uploaded", "jobId": job_id,
+                                       "pullUrl": status["pullUrl"], "duplicate": True})
+        return api_return(payload={"message": "Upload already queued", "jobId": job_id, "duplicate": True}, status=202)
+
+    upload_workers.notify()
+    logger.info(f"Queued upload job {job_id} from {gh_user_name}")
+
+    return api_return(payload={"message": "Upload queued", "jobId": job_id}, status=202)
+
+
+def upload_keys(gh_user_name, idempotency_key, payload) -> tuple:
     """
-        )
-    except Exception as e:
-        logger.exception("Failed to push or create PR")
-        return api_return(error="Failed to write to repository", status=500)
+    #(dedup key, content hash) of an upload. The content hash is taken over the canonical JSON of the
+    #job payload, which names the GitHub user. The dedup key is the client's Idempotency-Key, scoped
+    #to the GitHub user, when one is sent and the content hash otherwise.
+    """
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    content_hash = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+    if idempotency_key:
+        key = hashlib.sha256(f"{gh_user_name}\n{idempotency_key}".encode("utf-8")).hexdigest()
+        return f"key:{key}", content_hash
+    return f"content:{content_hash}", content_hash
+
+
+def upload_check_failed(name, result) -> bool:
+    """
+    #Whether the result of an upload check rejects the upload
+    """
+    if name == "token":
+        return result[1] is not None
+    if name == "login":
+        return result is None
+    return bool(result)
+
+
+def upload_check_response(token, name, outcome):
+    """
+    #Error response for the first failed upload check, outcome is its result or exception
+    """
+    if isinstance(outcome, TimeoutError):
+        logger.error("Upload checks timed out: %s", outcome)
+        return api_return(error="Verifying the upload timed out", status=504)
+    if name == "token":
+        _, error, err_code = outcome
+        if err_code == 404:
+            utils.forget_user(token)
+        return api_return(error=error, status=err_code)
+    if name == "login":
+        if isinstance(outcome, Exception):
+            logger.error("Failed to fetch GitHub username from token: %s", outcome)
+        return api_return(error="Failed to verify GitHub user", status=502)
+    if isinstance(outcome, Exception):
+        logger.error("Validation request failed: %s", outcome)
+        return api_return(error="Failed to validate info file", status=502)
+    return api_return(error=outcome, status=400)
+
+
+def valid_extra_files(extra_files) -> bool:
+    """
+    #Extra upload files must be a small {name: text} dict of plain names placed next to info.yml
+    """
+    if not isinstance(extra_files, dict) or len(extra_files) > MAX_EXTRA_FILES:
+        return False
+    return all(
+        isinstance(name, str) and EXTRA_FILE_NAME.match(name) and name != "info.yml" and isinstance(content, str)
+        for name, content in extra_files.items()
+    )
+
+
+@app.route('/upload-status/<job_id>', methods=['GET'])
+def upload_status(job_id):
+    """
+    #Stage by stage progress of a queued upload, with the pull request URL once it is done
+    """
+    status = upload_queue.status(job_id)
+    if status is None:
+        return api_return(error="Unknown upload job", status=404)
+    return api_return(payload=status)
+
+
+def run_upload(job) -> str:
+    """
+    #Runs the GitHub steps of a queued upload and returns the pull request URL
+    """
+    payload = job.payload
+    job.run_stage("sync", utils.sync_upstream)
+    branch = job.run_stage("commit", lambda: utils.push_upload(
+        payload["data"], payload["userName"], payload.get("extraFiles")))
+    return job.run_stage("pull_request", lambda: utils.create_pull_request_to_target(
+        head_branch=branch,
+        title=payload["title"],
+        body=payload["body"],
+    ))
+
 
-    return api_return(payload={"message": "Uploaded!", "pullUrl": url})
+upload_queue = UploadQueue(UPLOAD_QUEUE_DB, UPLOAD_STAGES, UPLOAD_MAX_ATTEMPTS, UPLOAD_RETRY_BACKOFF,
+                           dedup_window=UPLOAD_DEDUP_WINDOW)
+upload_workers = UploadWorkerPool(upload_queue, run_upload, UPLOAD_WORKERS)
+sampled(Gauge("upload_jobs", "Upload jobs per state", ("state",), multiprocess_mode="livemax"),
+        lambda: {(state,): n for state, n in upload_queue.counts().items()})
+sampled(Counter("upload_duplicates_total", "Uploads answered with an earlier job of the same content or key"),
+        lambda: upload_queue.duplicates)
+upload_workers.start()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001, debug=False)
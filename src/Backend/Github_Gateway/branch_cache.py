@@ -0,0 +1,79 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger('gunicorn.error')
+
+
+class BranchCache:
+    """
+    Branch names of a repository, fetched server side and shared by every user.
+
+    `fetch(background)` returns the list of branch names (all pages). The list is
+    kept serialized with a content-hash ETag, so unchanged lists keep their ETag
+    across refreshes. The first get() fetches synchronously, once for all
+    concurrent callers, and starts a daemon thread that refreshes every `ttl`
+    seconds. A failed refresh is logged and the previous list stays in use.
+    """
+
+    def __init__(self, fetch, ttl: float = 300):
+        self._fetch = fetch
+        self.ttl = ttl
+        # (body, etag, fetched_at), replaced as a whole
+        self._entry = None
+        self._lock = threading.Lock()
+        self._refresher = None
+        self.fetches = 0
+        self.failures = 0
+        self.last_error = None
+
+    def get(self) -> tuple:
+        """Return (body, etag) of the cached list, fetching it if there is none yet."""
+        entry = self._entry
+        if entry is None:
+            with self._lock:
+                if self._entry is None:
+                    self._refresh(background=False)
+                    self._start_background_refresh()
+                entry = self._entry
+        return entry[0], entry[1]
+
+    def refresh(self) -> None:
+        """Fetch the list again, keeping the current one if that fails."""
+        try:
+            self._refresh(background=True)
+        except Exception as e:
+            self.failures += 1
+            self.last_error = str(e)
+            logger.warning(f"Branch list refresh failed, serving the previous list: {e}")
+
+    def _refresh(self, background: bool) -> None:
+        branches = self._fetch(background)
+        body = json.dumps({"branches": branches}, separators=(",", ":")).encode("utf-8")
+        self._entry = (body, hashlib.sha256(body).hexdigest(), time.time())
+        self.fetches += 1
+
+    def _start_background_refresh(self) -> None:
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                time.sleep(self.ttl)
+                self.refresh()
+
+        self._refresher = threading.Thread(target=loop, name="branch-refresh", daemon=True)
+        self._refresher.start()
+
+    def stats(self) -> dict:
+        entry = self._entry
+        return {
+            "ttl": self.ttl,
+            "fetches": self.fetches,
+            "failures": self.failures,
+            "last_error": self.last_error,
+            "branches": len(json.loads(entry[0])["branches"]) if entry else None,
+            "age_seconds": time.time() - entry[2] if entry else None,
+        }
@@ -0,0 +1,40 @@
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+
+def run_until_failure(executor, calls: dict, is_failure, timeout: float) -> tuple:
+    """
+    Run the independent callables in calls ({name: func}) concurrently on executor.
+
+    Returns (results, failure). failure is None when every call returned a result for
+    which is_failure(name, result) is false. Otherwise it is (name, outcome) of the
+    first call that failed, where outcome is its result or the exception it raised,
+    and the remaining calls are cancelled: those not started yet never run, results
+    of running ones are discarded. Calls still running after timeout seconds fail
+    together as (names, TimeoutError).
+    """
+    # Each call runs in a copy of the caller's context, so it sees the caller's trace span
+    futures = {executor.submit(contextvars.copy_context().run, func): name for name, func in calls.items()}
+    deadline = time.monotonic() + timeout
+    results = {}
+    pending = set(futures)
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            if not done:
+                names = sorted(futures[future] for future in pending)
+                return results, (names, TimeoutError(f"{', '.join(names)} did not finish within {timeout} s"))
+            for future in done:
+                name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    return results, (name, e)
+                if is_failure(name, result):
+                    return results, (name, result)
+                results[name] = result
+        return results, None
+    finally:
+        for future in pending:
+            future.cancel()
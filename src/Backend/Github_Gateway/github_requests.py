@@ -0,0 +1,207 @@
+import heapq
+import itertools
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from github import GithubException
+
+logger = logging.getLogger('gunicorn.error')
+
+# Request priorities, lower goes first when the quota runs low
+UPLOAD, INTERACTIVE, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {UPLOAD: "upload", INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+
+class RateLimitExhausted(Exception):
+    """The quota of a token did not allow a request within its maximum wait."""
+
+    def __init__(self, key: str, priority: int, reset: float):
+        self.key = key
+        self.priority = priority
+        self.reset = reset
+        super().__init__(f"GitHub rate limit of {key} too low for {PRIORITY_NAMES[priority]} requests "
+                         f"until {time.strftime('%H:%M:%S', time.gmtime(reset))} UTC")
+
+
+class _Quota:
+    def __init__(self):
+        self.remaining = None
+        self.limit = None
+        self.reset = 0.0
+        self.waiting = []  # heap of (priority, seq)
+
+
+class RateLimitScheduler:
+    """
+    Admits GitHub requests against the rate limit quota of each token (keyed by
+    repository, installation tokens of one installation share a quota).
+
+    The quota is taken from the X-RateLimit-* values of the last response and
+    counted down locally for requests admitted since. While more than `reserve`
+    requests remain everything passes straight through. Below that, requests
+    queue and are admitted one at a time in priority order: background work
+    needs more than `reserve` left, interactive lookups more than half of it and
+    uploads may use the reserve up to the last request. A request that can't be
+    admitted waits for the window to reset, at most `max_wait` seconds, and then
+    raises RateLimitExhausted.
+
+    Quotas are tracked per process; each gunicorn worker corrects its count from
+    the headers of its own next response.
+    """
+
+    def __init__(self, reserve: int = 200, max_wait: float = 60):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.floors = {UPLOAD: 0, INTERACTIVE: reserve // 2, BACKGROUND: reserve}
+        self._quotas = {}
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self.admitted = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.rejected = {name: 0 for name in PRIORITY_NAMES.values()}
+        self.wait_seconds = 0.0
+
+    def _quota(self, key: str) -> _Quota:
+        quota = self._quotas.get(key)
+        if quota is None:
+            quota = self._quotas[key] = _Quota()
+        return quota
+
+    def _allowed(self, quota: _Quota, priority: int, cost: int) -> bool:
+        if quota.remaining is None or time.time() >= quota.reset:
+            return True
+        return quota.remaining - cost >= self.floors[priority]
+
+    def _low(self, quota: _Quota) -> bool:
+        return quota.remaining is not None and quota.remaining <= self.reserve and time.time() < quota.reset
+
+    def acquire(self, key: str, priority: int = UPLOAD, cost: int = 1, max_wait: float = None) -> None:
+        """Wait until cost requests of priority may be sent with the token of key."""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        name = PRIORITY_NAMES[priority]
+        with self._cond:
+            quota = self._quota(key)
+            if not quota.waiting and not self._low(quota):
+                self._admit(quota, name, cost)
+                return
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(quota.waiting, ticket)
+            self.queued[name] += 1
+            start = time.monotonic()
+            deadline = start + max_wait
+            try:
+                # The best waiting ticket is the most likely to be allowed, if it isn't nobody is
+                while not (quota.waiting[0] == ticket and self._allowed(quota, priority, cost)):
+                    now = time.monotonic()
+                    if now >= deadline:
+                        self.rejected[name] += 1
+                        raise RateLimitExhausted(key, priority, quota.reset)
+                    until_reset = max(quota.reset - time.time(), 0) + 1
+                    self._cond.wait(min(deadline - now, until_reset))
+                self._admit(quota, name, cost)
+            finally:
+                quota.waiting.remove(ticket)
+                heapq.heapify(quota.waiting)
+                self.wait_seconds += time.monotonic() - start
+                self._cond.notify_all()
+
+    def _admit(self, quota: _Quota, name: str, cost: int) -> None:
+        if quota.remaining is not None:
+            quota.remaining -= cost
+        self.admitted[name] += 1
+
+    def update(self, key: str, remaining: int, limit: int, reset: float) -> None:
+        """Record the quota GitHub reported for the token of key."""
+        with self._cond:
+            quota = self._quota(key)
+            quota.remaining, quota.limit, quota.reset = remaining, limit, reset
+            self._cond.notify_all()
+
+    def observe(self, key: str, requester) -> None:
+        """Record the quota from the last response seen by a PyGithub requester."""
+        remaining, limit = requester.rate_limiting
+        if remaining >= 0:
+            self.update(key, remaining, limit, requester.rate_limiting_resettime)
+
+    @contextmanager
+    def admit(self, key: str, requester, priority: int = UPLOAD, cost: int = 1, max_wait: float = None):
+        """Run the with block as cost requests of priority, reading the new quota from requester afterwards."""
+        self.acquire(key, priority, cost, max_wait)
+        try:
+            yield
+        finally:
+            self.observe(key, requester)
+
+    def stats(self) -> dict:
+        with self._cond:
+            quotas = {
+                key: {"remaining": q.remaining, "limit": q.limit, "reset": q.reset, "waiting": len(q.waiting)}
+                for key, q in self._quotas.items()
+            }
+        return {
+            "reserve": self.reserve,
+            "quotas": quotas,
+            "admitted": dict(self.admitted),
+            "queued": dict(self.queued),
+            "rejected": dict(self.rejected),
+            "wait_seconds": round(self.wait_seconds, 3),
+        }
+
+
+class ConditionalCache:
+    """
+    Last response of cacheable GitHub GETs, replayed with If-None-Match and
+    If-Modified-Since so that an unchanged resource costs a 304, which GitHub
+    does not count against the rate limit. Entries are keyed by token scope and
+    URL and the least recently used are dropped beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, requester, url: str):
+        """Return (data, headers) of GET url, revalidating a cached copy."""
+        with self._lock:
+            entry = self._entries.get((key, url))
+        headers = {}
+        if entry is not None:
+            data, resp_headers = entry
+            if "etag" in resp_headers:
+                headers["If-None-Match"] = resp_headers["etag"]
+            if "last-modified" in resp_headers:
+                headers["If-Modified-Since"] = resp_headers["last-modified"]
+
+        status, resp_headers, body = requester.requestJson("GET", url, headers=headers)
+        if status == 304 and entry is not None:
+            with self._lock:
+                self.hits += 1
+                if (key, url) in self._entries:
+                    self._entries.move_to_end((key, url))
+            return entry
+        if status != 200:
+            raise GithubException(status, body, resp_headers)
+
+        data = json.loads(body)
+        with self._lock:
+            self.misses += 1
+            self._entries[(key, url)] = (data, resp_headers)
+            self._entries.move_to_end((key, url))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return data, resp_headers
+
+    def stats(self) -> dict:
+        with self._lock:
+            size = len(self._entries)
+        total = self.hits + self.misses
+        return {"entries": size, "not_modified": self.hits, "modified": self.misses,
+                "not_modified_ratio": self.hits / total if total else None}
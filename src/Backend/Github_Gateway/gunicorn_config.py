@@ -1,4 +1,16 @@
-workers = 1
+import os
+import shutil
+
+# Workers write their metrics to files here and /metrics adds them up (prometheus_client multiprocess mode).
+# Set before prometheus_client is imported, the workers inherit it
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus-github-gateway")
+from prometheus_client import multiprocess  # noqa: E402
+
+# Concurrency. Each worker keeps its own installation token cache.
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", "8"))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "60"))
 bind = "0.0.0.0:5001"
 
 # Merge worker stdout/stderr into Gunicorn logs
@@ -9,4 +21,15 @@ loglevel = "info"
 
 # Gunicorn Configuration for Nginx
 forwarded_allow_ips = "*"  # Allow requests from Nginx
-proxy_protocol = True      # Enable proxy support
\ No newline at end of file
+proxy_protocol = True      # Enable proxy support
+
+
+def on_starting(server):
+    # Metric files of an earlier gunicorn run would be added to the new values
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def child_exit(server, worker):
+    # Drops the live gauges of the exited worker, its counters and histograms stay in the totals
+    multiprocess.mark_process_dead(worker.pid)
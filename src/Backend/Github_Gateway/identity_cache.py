@@ -0,0 +1,64 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class IdentityCache:
+    """
+    TTL cache for GitHub lookups made on behalf of a user token, such as the login
+    behind the token and its permission on the target repository.
+
+    Entries are keyed by a SHA-256 of the token, the raw token is never stored.
+    Negative results (invalid token, no push access) expire after `negative_ttl`
+    so a user who was just granted access doesn't wait long to see it.
+    """
+
+    def __init__(self, ttl: float = 300, negative_ttl: float = 30, maxsize: int = 1024):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def token_key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get_or_load(self, token: str, kind: str, loader, is_negative=lambda value: value is None):
+        """
+        Return the cached `kind` value for token, calling loader() on a miss.
+        Exceptions from loader are not cached.
+        """
+        key = (self.token_key(token), kind)
+        now = time.monotonic()
+        with self._lock:
+            value, expires = self._entries.get(key, (_MISSING, 0))
+            if value is not _MISSING and expires > now:
+                self.hits += 1
+                return value
+            self.misses += 1
+
+        value = loader()
+        ttl = self.negative_ttl if is_negative(value) else self.ttl
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, token: str) -> None:
+        """Forget everything cached for token."""
+        token_key = self.token_key(token)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == token_key]:
+                del self._entries[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
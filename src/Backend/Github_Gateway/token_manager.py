@@ -0,0 +1,149 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from github import Github, GithubIntegration
+
+logger = logging.getLogger('gunicorn.error')
+
+
+class _CachedInstallation:
+    """Token, client and repo object of one repository, plus its mint metrics."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (token, expires, client, repo), replaced as a whole
+        self.current = (None, datetime.min.replace(tzinfo=timezone.utc), None, None)
+        self.mints = 0
+        self.failures = 0
+        self.mint_seconds_total = 0.0
+        self.mint_seconds_last = None
+        self.mint_seconds_max = 0.0
+
+
+class InstallationTokenManager:
+    """
+    Mints GitHub App installation tokens per repository and caches them together with
+    the client and repo object built on them.
+
+    A token is used until `expiry_margin` before it expires. Only one thread mints per
+    repository, concurrent callers wait for that mint instead of starting their own.
+    The background refresher renews tokens once they are within `refresh_margin` of
+    expiring, so user requests normally never wait for a mint. `load_repo(client, name)`
+    builds the repo object for a new client, by default with client.get_repo(name).
+    """
+
+    def __init__(self, integration_map: dict,
+                 expiry_margin: timedelta = timedelta(minutes=5),
+                 refresh_margin: timedelta = timedelta(minutes=10),
+                 base_url: str = "https://api.github.com",
+                 pool_size: int = 10,
+                 load_repo=None):
+        self._integrations = integration_map
+        self._base_url = base_url
+        self._pool_size = pool_size
+        self._load_repo = load_repo or (lambda client, name: client.get_repo(name))
+        self._expiry_margin = expiry_margin
+        self._refresh_margin = refresh_margin
+        self._cache = {name: _CachedInstallation() for name in integration_map}
+        self._refresher = None
+
+    def get_integration(self, repo_full_name: str) -> GithubIntegration:
+        if repo_full_name in self._integrations:
+            return self._integrations[repo_full_name]
+        raise ValueError(f"Unknown repository for integration: {repo_full_name}")
+
+    def get(self, repo_full_name: str):
+        """Return (client, repo) for repo_full_name, minting a new token only when needed."""
+        self.get_integration(repo_full_name)
+        entry = self._cache[repo_full_name]
+        _, expires, client, repo = entry.current
+        if client is not None and not self._expiring(expires, self._expiry_margin):
+            return client, repo
+
+        with entry.lock:
+            # Another thread may have minted while we waited for the lock
+            _, expires, client, repo = entry.current
+            if client is None or self._expiring(expires, self._expiry_margin):
+                self._mint(repo_full_name, entry)
+            _, _, client, repo = entry.current
+        return client, repo
+
+    def refresh_expiring(self) -> None:
+        """Mint new tokens for every repository within refresh_margin of expiry."""
+        for repo_full_name, entry in self._cache.items():
+            if not self._expiring(entry.current[1], self._refresh_margin):
+                continue
+            with entry.lock:
+                if self._expiring(entry.current[1], self._refresh_margin):
+                    try:
+                        self._mint(repo_full_name, entry)
+                    except Exception:
+                        logger.exception("Background token refresh failed for %s", repo_full_name)
+
+    def start_background_refresh(self, interval: float = 60) -> None:
+        """Run refresh_expiring every `interval` seconds in a daemon thread."""
+        if self._refresher is not None:
+            return
+
+        def loop():
+            while True:
+                self.refresh_expiring()
+                time.sleep(interval)
+
+        self._refresher = threading.Thread(target=loop, name="token-refresh", daemon=True)
+        self._refresher.start()
+
+    def stats(self) -> dict:
+        now = datetime.now(timezone.utc)
+        out = {}
+        for repo_full_name, entry in self._cache.items():
+            token, expires, _, _ = entry.current
+            out[repo_full_name] = {
+                "mints": entry.mints,
+                "failures": entry.failures,
+                "mint_seconds_last": entry.mint_seconds_last,
+                "mint_seconds_avg": entry.mint_seconds_total / entry.mints if entry.mints else None,
+                "mint_seconds_max": entry.mint_seconds_max,
+                "seconds_until_expiry": (expires - now).total_seconds() if token else None,
+            }
+        return out
+
+    def rate_limits(self) -> dict:
+        """(remaining, limit) of each installation token as reported by its last GitHub response."""
+        out = {}
+        for repo_full_name, entry in self._cache.items():
+            client = entry.current[2]
+            if client is not None:
+                remaining, limit = client._Github__requester.rate_limiting
+                if remaining >= 0:
+                    out[repo_full_name] = (remaining, limit)
+        return out
+
+    def _mint(self, repo_full_name: str, entry: _CachedInstallation) -> None:
+        """Mint a token and build client and repo object. Call with entry.lock held."""
+        start = time.perf_counter()
+        try:
+            owner, repo = repo_full_name.split("/", 1)
+            integration = self.get_integration(repo_full_name)
+            installation = integration.get_repo_installation(owner, repo)
+            tok = integration.get_access_token(installation.id)
+
+            client = Github(tok.token, base_url=self._base_url, pool_size=self._pool_size)
+            repo_obj = self._load_repo(client, repo_full_name)
+        except Exception:
+            entry.failures += 1
+            raise
+        elapsed = time.perf_counter() - start
+
+        entry.current = (tok.token, tok.expires_at, client, repo_obj)
+        entry.mints += 1
+        entry.mint_seconds_total += elapsed
+        entry.mint_seconds_last = elapsed
+        entry.mint_seconds_max = max(entry.mint_seconds_max, elapsed)
+        logger.info(f"Refreshed token for {repo_full_name} in {elapsed:.3f} s")
+
+    @staticmethod
+    def _expiring(expires: datetime, margin: timedelta) -> bool:
+        return datetime.now(timezone.utc) + margin >= expires
@@ -0,0 +1,240 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from tracing import span
+
+logger = logging.getLogger('gunicorn.error')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id       TEXT PRIMARY KEY,
+    state    TEXT NOT NULL,
+    stage    TEXT,
+    stages   TEXT NOT NULL,
+    results  TEXT NOT NULL,
+    payload  TEXT NOT NULL,
+    pull_url TEXT,
+    error    TEXT,
+    created  REAL NOT NULL,
+    updated  REAL NOT NULL,
+    dedup_key    TEXT,
+    content_hash TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS upload_jobs_dedup_key ON upload_jobs (dedup_key);
+"""
+
+
+class IdempotencyConflict(ValueError):
+    """An idempotency key was reused for a different upload."""
+
+
+class UploadJob:
+    """
+    One queued upload. Stages run in order; each one is retried with exponential
+    backoff and its result is stored, so a job picked up again after a crash
+    continues after the last finished stage.
+    """
+
+    def __init__(self, queue, row: sqlite3.Row):
+        self._queue = queue
+        self.id = row["id"]
+        self.payload = json.loads(row["payload"])
+        self.stages = json.loads(row["stages"])
+        self.results = json.loads(row["results"])
+
+    def run_stage(self, name: str, func):
+        """Run func() as stage name unless it already finished, returning its result."""
+        if self.stages.get(name) == "done":
+            return self.results.get(name)
+        attempts, backoff = self._queue.attempts, self._queue.backoff
+        for attempt in range(1, attempts + 1):
+            self.stages[name] = "running"
+            self._queue.update(self.id, stage=name, stages=self.stages)
+            try:
+                with span(f"upload.{name}", job=self.id, attempt=attempt):
+                    result = func()
+            except Exception as e:
+                logger.warning("Upload job %s stage '%s' attempt %d/%d failed: %s",
+                               self.id, name, attempt, attempts, e)
+                if attempt == attempts:
+                    self.stages[name] = "failed"
+                    self._queue.update(self.id, stages=self.stages)
+                    raise
+                time.sleep(backoff * 2 ** (attempt - 1))
+                continue
+            self.stages[name] = "done"
+            self.results[name] = result
+            self._queue.update(self.id, stages=self.stages, results=self.results)
+            return result
+
+
+class UploadQueue:
+    """
+    Persistent upload job queue in a local SQLite database, shared by all gunicorn
+    workers. Each stage of a job is tried `attempts` times, waiting `backoff` seconds
+    doubled per retry. Running jobs whose worker stopped updating them for `lease`
+    seconds are picked up again.
+
+    Jobs enqueued with a dedup key are unique per key for `dedup_window` seconds:
+    enqueueing the same key again returns the existing job, so repeated submissions
+    share one branch and pull request. A failed job releases its key.
+    """
+
+    def __init__(self, db_path: str, stages: tuple, attempts: int = 3, backoff: float = 2.0, lease: float = 600,
+                 dedup_window: float = 86400):
+        self.db_path = db_path
+        self.stages = stages
+        self.attempts = attempts
+        self.backoff = backoff
+        self.lease = lease
+        self.dedup_window = dedup_window
+        self.duplicates = 0
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def enqueue(self, payload: dict, dedup_key: str = None, content_hash: str = None) -> tuple:
+        """
+        Queue payload and return (job_id, True). With dedup_key, an earlier job with the same
+        key that hasn't failed is returned as (job_id, False) instead of queueing a new one.
+        Raises IdempotencyConflict if that job was queued with a different content_hash.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._connect()
+        # IMMEDIATE serializes concurrent duplicates across threads and gunicorn workers
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if dedup_key is not None:
+                row = conn.execute("SELECT id, state, content_hash, created FROM upload_jobs WHERE dedup_key = ?",
+                                   (dedup_key,)).fetchone()
+                if row is not None and row["state"] != "failed" and row["created"] >= now - self.dedup_window:
+                    conn.execute("COMMIT")
+                    if content_hash is not None and row["content_hash"] not in (None, content_hash):
+                        raise IdempotencyConflict(f"Idempotency key already used for upload job {row['id']}")
+                    self.duplicates += 1
+                    return row["id"], False
+                if row is not None:
+                    conn.execute("UPDATE upload_jobs SET dedup_key = NULL WHERE id = ?", (row["id"],))
+            conn.execute(
+                "INSERT INTO upload_jobs (id, state, stages, results, payload, created, updated, dedup_key, content_hash) "
+                "VALUES (?, 'queued', ?, '{}', ?, ?, ?, ?, ?)",
+                (job_id, json.dumps({name: "pending" for name in self.stages}), json.dumps(payload), now, now,
+                 dedup_key, content_hash),
+            )
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            conn.execute("ROLLBACK")
+            raise
+        return job_id, True
+
+    def claim(self):
+        """Take the oldest queued (or abandoned) job and mark it running. Returns None if there is none."""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM upload_jobs WHERE state = 'queued' OR (state = 'running' AND updated < ?) "
+                "ORDER BY created LIMIT 1",
+                (now - self.lease,),
+            ).fetchone()
+            if row is not None:
+                conn.execute("UPDATE upload_jobs SET state = 'running', updated = ? WHERE id = ?", (now, row["id"]))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return UploadJob(self, row) if row is not None else None
+
+    def update(self, job_id: str, **fields) -> None:
+        """Update columns of a job. stages and results are stored as JSON."""
+        for name in ("stages", "results"):
+            if name in fields:
+                fields[name] = json.dumps(fields[name])
+        fields["updated"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        self._connect().execute(f"UPDATE upload_jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def counts(self) -> dict:
+        """Number of jobs per state."""
+        rows = self._connect().execute("SELECT state, COUNT(*) AS n FROM upload_jobs GROUP BY state").fetchall()
+        return {row["state"]: row["n"] for row in rows}
+
+    def status(self, job_id: str):
+        """Return the public status of a job, or None if it is unknown."""
+        row = self._connect().execute("SELECT * FROM upload_jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            "jobId": row["id"],
+            "state": row["state"],
+            "stage": row["stage"],
+            "stages": json.loads(row["stages"]),
+            "pullUrl": row["pull_url"],
+            "error": row["error"],
+        }
+
+
+class UploadWorkerPool:
+    """Threads that take jobs from an UploadQueue and pass them to handler(job)."""
+
+    def __init__(self, queue: UploadQueue, handler, workers: int = 2, poll_interval: float = 1.0):
+        self._queue = queue
+        self._handler = handler
+        self._workers = workers
+        self._poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._threads = []
+
+    def start(self) -> None:
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._loop, name=f"upload-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def notify(self) -> None:
+        """Wake the workers after a job was enqueued in this process."""
+        self._wakeup.set()
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                job = self._queue.claim()
+            except sqlite3.Error:
+                logger.exception("Failed to claim upload job")
+                job = None
+            if job is None:
+                self._wakeup.wait(self._poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _run(self, job: UploadJob) -> None:
+        # The job continues the trace of the request that queued it
+        with span("upload_job", parent=job.payload.get("traceparent"), job=job.id) as job_span:
+            logger.info("Running upload job %s", job.id)
+            try:
+                pull_url = self._handler(job)
+            except Exception:
+                job_span.status = "error"
+                logger.exception("Upload job %s failed", job.id)
+                self._queue.update(job.id, state="failed", error="Failed to write to repository")
+                return
+            self._queue.update(job.id, state="succeeded", stage=None, pull_url=pull_url)
+            logger.info("Upload job %s finished: %s", job.id, pull_url)
@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger('gunicorn.error')
+
+
+class UpstreamSync:
+    """
+    Debounces the merge-upstream sync of the work repo.
+
+    `merge()` performs the actual sync and returns whether it succeeded, and
+    `head(etag)` returns (status, sha, etag) of
+    the upstream branch, sending the etag as If-None-Match so an unchanged head costs
+    a 304 that GitHub does not count against the rate limit. The merge is skipped when
+    the last successful sync is less than `window` seconds old, or when the upstream
+    head is still the SHA that was last merged. Only one thread syncs at a time;
+    uploads that arrive meanwhile wait for it and then skip their own merge. A failed
+    merge records nothing, so the next upload tries again.
+    """
+
+    def __init__(self, merge, head, window: float = 30):
+        self._merge = merge
+        self._head = head
+        self.window = window
+        self._lock = threading.Lock()
+        self.synced_at = None
+        self.synced_sha = None
+        self._etag = None
+        self.merges = 0
+        self.failed = 0
+        self.skipped_recent = 0
+        self.skipped_unchanged = 0
+
+    def sync(self) -> str:
+        """Bring the work repo up to date if needed. Returns 'recent', 'unchanged', 'merged' or 'failed'."""
+        with self._lock:
+            if self.synced_at is not None and time.monotonic() - self.synced_at < self.window:
+                self.skipped_recent += 1
+                return "recent"
+
+            try:
+                status, sha, etag = self._head(self._etag)
+            except Exception as e:
+                # The head check is only an optimization, fall back to merging
+                logger.warning(f"Failed to read upstream head, syncing anyway: {e}")
+                status, sha, etag = None, None, None
+
+            if self.synced_sha is not None and (status == 304 or (sha is not None and sha == self.synced_sha)):
+                self.synced_at = time.monotonic()
+                self.skipped_unchanged += 1
+                return "unchanged"
+
+            if not self._merge():
+                self.failed += 1
+                return "failed"
+            self.merges += 1
+            self.synced_at = time.monotonic()
+            if status != 304:
+                self.synced_sha, self._etag = sha, etag
+            return "merged"
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "merges": self.merges,
+            "failed": self.failed,
+            "skipped_recent": self.skipped_recent,
+            "skipped_unchanged": self.skipped_unchanged,
+            "synced_sha": self.synced_sha,
+            "seconds_since_sync": time.monotonic() - self.synced_at if self.synced_at is not None else None,
+        }
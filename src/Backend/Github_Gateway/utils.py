@@ -1,12 +1,22 @@
 # app.py
-import os, yaml, time
-import requests 
-from github import Github,GithubIntegration, Auth
+import os, yaml, time, uuid, json, functools
+import urllib.parse
+from contextlib import contextmanager
+from github import Github,GithubIntegration, Auth, GithubException, InputGitTreeElement
+from github.Branch import Branch
 from github.Repository import Repository
 from flask import current_app as app 
 import logging
-from datetime import datetime, timedelta,timezone
 from typing import Dict
+from token_manager import InstallationTokenManager
+from identity_cache import IdentityCache
+from upstream_sync import UpstreamSync
+from branch_cache import BranchCache
+from github_requests import RateLimitScheduler, ConditionalCache, RateLimitExhausted, UPLOAD, INTERACTIVE, BACKGROUND
+from http_session import pooled_session, HTTP_POOL_SIZE
+from prometheus_client import Counter, Gauge, Histogram
+from metrics import sampled, DEFAULT_BUCKETS
+from tracing import span, inject
 #Constants:
 # Base URL for Databank API which is reference to running container
 databank_api_url = os.getenv("DATABANK_API_URL", "http://databank_api:8000")
@@ -18,9 +28,22 @@ HELPER_APP_ID      = int(os.getenv("HELPER_APP_ID"))
 HELPER_PRIVATE_KEY= os.getenv("HELPER_PRIVATE_KEY")
 ADMIN_APP_ID = int(os.getenv("ADMIN_APP_ID"))
 ADMIN_PRIVATE_KEY = os.getenv("ADMIN_PRIVATE_KEY")
+# GitHub REST API root, overridable for GitHub Enterprise or a local fake server
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")
+# Lifetime in seconds of cached user logins/permissions, and of failed lookups
+IDENTITY_CACHE_TTL = float(os.getenv("IDENTITY_CACHE_TTL", "300"))
+IDENTITY_CACHE_NEGATIVE_TTL = float(os.getenv("IDENTITY_CACHE_NEGATIVE_TTL", "30"))
+# Seconds after a merge-upstream sync during which uploads don't sync again
+UPSTREAM_SYNC_WINDOW = float(os.getenv("UPSTREAM_SYNC_WINDOW", "30"))
+# Requests of an installation's GitHub quota kept for uploads once it runs low, and the longest a request waits for quota
+GITHUB_RATE_LIMIT_RESERVE = int(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "200"))
+GITHUB_RATE_LIMIT_MAX_WAIT = float(os.getenv("GITHUB_RATE_LIMIT_MAX_WAIT", "60"))
+# Seconds between background refreshes of the branch list served at /branches
+BRANCH_CACHE_TTL = float(os.getenv("BRANCH_CACHE_TTL", "300"))
+BRANCHES_PER_PAGE = 100
 
-helper_integration = GithubIntegration(auth=Auth.AppAuth(app_id=HELPER_APP_ID,private_key=HELPER_PRIVATE_KEY))
-admin_integration = GithubIntegration(auth=Auth.AppAuth(app_id=ADMIN_APP_ID,private_key=ADMIN_PRIVATE_KEY))
+helper_integration = GithubIntegration(base_url=GITHUB_API_URL, auth=Auth.AppAuth(app_id=HELPER_APP_ID,private_key=HELPER_PRIVATE_KEY))
+admin_integration = GithubIntegration(base_url=GITHUB_API_URL, auth=Auth.AppAuth(app_id=ADMIN_APP_ID,private_key=ADMIN_PRIVATE_KEY))
 
 
 
@@ -33,27 +56,75 @@ integration_map =  {
 }
 
 
-#Caching the tokens which are valid for 1 hour
-token_cache = {
-    WORK_REPO_NAME: {
-        "token":   None,
-        "expires": datetime.min.replace(tzinfo=timezone.utc),
-        "client":  None,
-        "repo":    None
-    },
-    PULL_REQUEST_TARGET_REPO: {
-        "token":   None,
-        "expires": datetime.min.replace(tzinfo=timezone.utc),
-        "client":  None,
-        "repo":    None
-    },
-}
+#Admits GitHub requests against the quota of each installation, uploads first when it runs low
+rate_limits = RateLimitScheduler(GITHUB_RATE_LIMIT_RESERVE, GITHUB_RATE_LIMIT_MAX_WAIT)
+#Revalidates cacheable GitHub GETs with their ETag, unchanged answers are 304s that don't use quota
+conditional_cache = ConditionalCache()
+
+
+def load_repo(client: Github, repo_full_name: str) -> Repository:
+    """Repo object for a freshly minted token, revalidating the one fetched with the previous token"""
+    requester = client._Github__requester
+    with rate_limits.admit(repo_full_name, requester, UPLOAD):
+        data, headers = conditional_cache.get(repo_full_name, requester, f"/repos/{repo_full_name}")
+    return client.create_from_raw_data(Repository, data, headers)
+
+
+#Caches the installation tokens, which are valid for 1 hour, and renews them in the background
+token_manager = InstallationTokenManager(integration_map, base_url=GITHUB_API_URL, pool_size=HTTP_POOL_SIZE,
+                                         load_repo=load_repo)
+token_manager.start_background_refresh()
+
+#Keep-alive connections to the Databank API and to GitHub for calls made with user tokens
+databank_session = pooled_session("databank_api")
+github_session = pooled_session("github")
+
+#Caches user logins and permissions by token hash
+identity_cache = IdentityCache(IDENTITY_CACHE_TTL, IDENTITY_CACHE_NEGATIVE_TTL)
+
+#Durations of the calls the gateway makes to GitHub and the Databank API, served at /metrics
+call_seconds = Histogram("gateway_call_seconds", "Duration of outgoing GitHub and Databank API calls",
+                         ("target", "operation"), buckets=DEFAULT_BUCKETS)
+call_errors = Counter("gateway_call_errors_total", "Outgoing calls that raised", ("target", "operation"))
+sampled(Gauge("github_rate_limit_remaining", "Requests left in the rate limit window of each installation token",
+              ("repo",), multiprocess_mode="livemin"),
+        lambda: {(repo,): remaining for repo, (remaining, _) in token_manager.rate_limits().items()})
+sampled(Gauge("github_rate_limit", "Rate limit of each installation token", ("repo",), multiprocess_mode="livemax"),
+        lambda: {(repo,): limit for repo, (_, limit) in token_manager.rate_limits().items()})
+sampled(Counter("github_token_mints_total", "Installation tokens minted", ("repo",)),
+        lambda: {(repo,): s["mints"] for repo, s in token_manager.stats().items()})
+sampled(Gauge("github_requests_waiting", "Requests waiting for GitHub quota per installation",
+              ("repo",), multiprocess_mode="livesum"),
+        lambda: {(repo,): q["waiting"] for repo, q in rate_limits.stats()["quotas"].items()})
+sampled(Counter("github_requests_rejected_total", "Requests given up after waiting for GitHub quota", ("priority",)),
+        lambda: {(priority,): n for priority, n in rate_limits.rejected.items()})
+sampled(Counter("github_conditional_requests_total", "Revalidated GitHub GETs by answer", ("result",)),
+        lambda: {("not_modified",): conditional_cache.hits, ("modified",): conditional_cache.misses})
+sampled(Counter("identity_cache_requests_total", "Identity cache lookups by result", ("result",)),
+        lambda: {("hit",): identity_cache.hits, ("miss",): identity_cache.misses})
+
+
+def timed_call(target: str, operation: str):
+    """
+    Decorator recording duration and failures of an outgoing call in call_seconds and
+    call_errors, and the call as a span of the current trace
+    """
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with call_seconds.labels(target, operation).time(), span(f"{target}.{operation}"):
+                try:
+                    return func(*args, **kwargs)
+                except Exception:
+                    call_errors.labels(target, operation).inc()
+                    raise
+        return wrapper
+    return decorate
+
 
 def get_integration(repo_full_name:str) -> GithubIntegration:
     """" Return integration for the given full name of repository name. e.g NMRLipids/UserData"""
-    if repo_full_name in integration_map:
-        return integration_map[repo_full_name]
-    else: raise ValueError(F"Unknown repository for integration: {repo_full_name}")
+    return token_manager.get_integration(repo_full_name)
 
 
 
@@ -61,31 +132,9 @@ def get_github_client_and_repo(repo_full_name: str):
     """
     Returns (client, repo) for repo_full_name, caching both until just
     before the token expires (5-minute buffer). Mints a fresh token 
-    and repo object only when needed.
-    """
-    cache = token_cache[repo_full_name]
-    now   = datetime.now(timezone.utc)
-    
-    if cache["token"] is None or now + timedelta(minutes=5) >= cache["expires"]:
-        owner, repo = repo_full_name.split("/", 1)
-        integration = get_integration(repo_full_name)
-        installation = integration.get_repo_installation(owner, repo)
-        tok          = integration.get_access_token(installation.id)
-        
-        client = Github(tok.token)
-        repo_obj = client.get_repo(repo_full_name)
-        
-        cache.update({
-            "token":   tok.token,
-            "expires": tok.expires_at,
-            "client":  client,
-            "repo":    repo_obj
-        })
-        logger.info(f"Refreshed token for {repo_full_name}")
-    else:
-        logger.info(f"Reusing cached client for {repo_full_name}. Remaining lifetime: {cache['expires']-now}")
-
-    return cache["client"], cache["repo"]
+    and repo object only when needed, once for all concurrent callers.
+    """
+    return token_manager.get(repo_full_name)
 
 
 
@@ -110,14 +159,34 @@ def get_repo_target() -> Repository:
     return repo
 
 
-def is_input_invalid(info_yaml_dict: dict):
+@contextmanager
+def github_request(repo_full_name: str, priority: int = UPLOAD, cost: int = 1, max_wait: float = None):
+    """
+    Yields the repo object of repo_full_name once `cost` requests of `priority` may be made
+    with its installation token, and records the quota GitHub reports after the block.
+    Raises RateLimitExhausted if the quota doesn't allow them within max_wait seconds.
+    """
+    _, repo = get_github_client_and_repo(repo_full_name)
+    with rate_limits.admit(repo_full_name, repo._requester, priority, cost, max_wait):
+        yield repo
+
+
+def get_branch(repo: Repository, branch: str) -> Branch:
+    """Branch of repo, revalidated with a conditional request"""
+    url = f"{repo.url}/branches/{urllib.parse.quote(branch)}"
+    data, headers = conditional_cache.get(repo.full_name, repo._requester, url)
+    return Branch(repo._requester, headers, data)
+
+
+@timed_call("databank_api", "info_valid_check")
+def is_input_invalid(info_yaml_dict: dict, timeout: float = 10):
     """
     Validates the provided YAML dict via the Databank API.
     Returns None if valid, otherwise the error(s)
     """
     logger.info(f"Validating info yml")
-    resp = requests.post(
-        f"{databank_api_url}/info-valid-check", json=info_yaml_dict,timeout=10
+    resp = databank_session.post(
+        f"{databank_api_url}/info-valid-check", json=info_yaml_dict, headers=inject(), timeout=timeout
     )
     if resp.status_code == 200:
         return None
@@ -130,35 +199,110 @@ def is_input_invalid(info_yaml_dict: dict):
     return errors;  
 
 
-def sync_upstream():
-    """ Pulls latest changes from upstream into work repo"""
+@timed_call("github", "merge_upstream")
+def merge_upstream() -> bool:
+    """ Pulls latest changes from upstream into work repo, returns whether GitHub accepted the merge"""
     try:
-        status, headers, body = get_gh_work()._Github__requester.requestJson(
-            "POST",
-            f"/repos/{WORK_REPO_NAME}/merge-upstream",
-            input={"branch": WORK_BASE_BRANCH}
-        )
+        #Background work, gives way to uploads instead of waiting for quota
+        with github_request(WORK_REPO_NAME, BACKGROUND, max_wait=0) as repo_work:
+            status, headers, body = repo_work._requester.requestJson(
+                "POST",
+                f"/repos/{WORK_REPO_NAME}/merge-upstream",
+                input={"branch": WORK_BASE_BRANCH}
+            )
         logger.info(f"Sync upstream status: {status}")
         if (200 <= status < 300):
             logger.info(f"Successfully synced work-repo against upstream")
-        else:
-            msg = f"Failed to sync upstream: code={status}, error={body}"
-            logger.error(msg)
+            return True
+        msg = f"Failed to sync upstream: code={status}, error={body}"
+        logger.error(msg)
+        return False
     except Exception as e:
         logger.error(f"Failed to sync upstream for {WORK_REPO_NAME}: {e}")
         raise
 
 
+@timed_call("github", "upstream_head")
+def upstream_head(etag: str = None):
+    """
+    Returns (status, sha, etag) of the upstream base branch. With etag, GitHub answers
+    304 and no sha when the branch hasn't moved, which doesn't count against the rate limit.
+    """
+    headers = {"If-None-Match": etag} if etag else None
+    with github_request(PULL_REQUEST_TARGET_REPO, BACKGROUND, max_wait=0) as repo_target:
+        status, resp_headers, body = repo_target._requester.requestJson(
+            "GET",
+            f"/repos/{PULL_REQUEST_TARGET_REPO}/git/ref/heads/{WORK_BASE_BRANCH}",
+            headers=headers,
+        )
+    if status == 304:
+        return status, None, etag
+    if status != 200:
+        raise RuntimeError(f"Failed to read upstream head: code={status}, error={body}")
+    return status, json.loads(body)["object"]["sha"], resp_headers.get("etag")
+
+
+#Skips merge-upstream when the work repo was synced recently or upstream hasn't moved since
+upstream_sync = UpstreamSync(merge_upstream, upstream_head, UPSTREAM_SYNC_WINDOW)
+
+
+def sync_upstream() -> str:
+    """
+    Syncs the work repo with upstream unless that is known to be unnecessary.
+    Returns 'deferred' without syncing when the GitHub quota is kept for uploads, and
+    'failed' when GitHub refused the merge, in which case the upload goes on without it.
+    """
+    try:
+        result = upstream_sync.sync()
+    except RateLimitExhausted as e:
+        logger.warning(f"Deferred upstream sync: {e}")
+        return "deferred"
+    if result == "failed":
+        logger.warning("Upstream sync failed, continuing with the work repo as it is")
+    elif result != "merged":
+        logger.info(f"Skipped upstream sync: {result}")
+    return result
+
+
+@timed_call("github", "list_branches")
+def list_branches(background: bool = True) -> list:
+    """
+    Names of all branches of the pull request target repo, page by page. Pages are revalidated
+    with their ETag, so an unchanged list costs only 304s. Background refreshes give way to uploads.
+    """
+    priority, max_wait = (BACKGROUND, 0) if background else (INTERACTIVE, None)
+    names = []
+    page = 1
+    while True:
+        with github_request(PULL_REQUEST_TARGET_REPO, priority, max_wait=max_wait) as repo:
+            url = f"{repo.url}/branches?per_page={BRANCHES_PER_PAGE}&page={page}"
+            data, _ = conditional_cache.get(PULL_REQUEST_TARGET_REPO, repo._requester, url)
+        names.extend(branch["name"] for branch in data)
+        if len(data) < BRANCHES_PER_PAGE:
+            return names
+        page += 1
+
+
+#Branch list of the target repo shared by all users, refreshed in the background once requested
+branch_cache = BranchCache(list_branches, BRANCH_CACHE_TTL)
+
+
+def new_branch_name() -> str:
+    """Timestamped branch name, with a random suffix so concurrent uploads don't collide"""
+    ts = time.strftime("%Y%m%d%H%M%S", time.gmtime())
+    return f"bot/info_yaml_{ts}_{uuid.uuid4().hex[:6]}"
+
+
+@timed_call("github", "branch_out")
 def branch_out(base_branch: str = WORK_BASE_BRANCH) -> str:
     """
     Creates and returns a new timestamped branch off based off WORK_BASE_BRANCH.
     """
-    ts         = time.strftime("%Y%m%d%H%M%S", time.gmtime())
-    new_branch = f"bot/info_yaml_{ts}"
-    repo_work = get_repo_work()
+    new_branch = new_branch_name()
     try: 
-        sha = repo_work.get_branch(base_branch).commit.sha
-        repo_work.create_git_ref(ref=f"refs/heads/{new_branch}", sha=sha)
+        with github_request(WORK_REPO_NAME, UPLOAD, cost=2) as repo_work:
+            sha = get_branch(repo_work, base_branch).commit.sha
+            repo_work.create_git_ref(ref=f"refs/heads/{new_branch}", sha=sha)
         logger.info(f"Created branch {new_branch}")
     except Exception as e:
         logger.error(f"Failed to create branch, error: {e}")
@@ -166,22 +310,55 @@ def branch_out(base_branch: str = WORK_BASE_BRANCH) -> str:
 
     return new_branch
 
-def push_info_file(data: dict, username: str) -> str:
-    logger.info(f"Pushing to repository with data from {username}")
-    sync_upstream()
-    new_branch = branch_out(WORK_BASE_BRANCH)
-    yaml_text  = yaml.safe_dump(data, sort_keys=False, width=120)
-    path       = f"UserData/info.yml"
-    message    = f"Add info.yml from {username}"
-
-    get_repo_work().create_file(
-        path=path,
-        message=message,
-        content=yaml_text,
-        branch=new_branch
-    )
+
+def info_files(data: dict, extra_files: Dict[str, str] = None) -> Dict[str, str]:
+    """Repository paths and contents of an upload: UserData/info.yml plus any extra files next to it"""
+    files = {"UserData/info.yml": yaml.safe_dump(data, sort_keys=False, width=120)}
+    for name, content in (extra_files or {}).items():
+        files[f"UserData/{name}"] = content
+    return files
+
+
+@timed_call("github", "commit_files")
+def commit_files(files: Dict[str, str], message: str, base_branch: str = WORK_BASE_BRANCH) -> str:
+    """
+    Writes files ({path: text}) to the work repo as a single commit on a new branch
+    off base_branch and returns the branch name.
+
+    Several files go through the Git Data API, four requests regardless of the number
+    of files: read the base branch, create a tree with the contents inline (GitHub
+    creates the blobs), create the commit and create the branch ref pointing at it.
+    A single file is cheaper as branch + create_file, three requests.
+    """
+    if len(files) == 1:
+        [(path, content)] = files.items()
+        new_branch = branch_out(base_branch)
+        with github_request(WORK_REPO_NAME, UPLOAD) as repo_work:
+            repo_work.create_file(path=path, message=message, content=content, branch=new_branch)
+        return new_branch
+
+    new_branch = new_branch_name()
+    try:
+        with github_request(WORK_REPO_NAME, UPLOAD, cost=4) as repo_work:
+            base = get_branch(repo_work, base_branch).commit
+            elements = [InputGitTreeElement(path, "100644", "blob", content=content) for path, content in files.items()]
+            tree   = repo_work.create_git_tree(elements, base.commit.tree)
+            commit = repo_work.create_git_commit(message, tree, [base.commit])
+            repo_work.create_git_ref(ref=f"refs/heads/{new_branch}", sha=commit.sha)
+        logger.info(f"Committed {len(files)} file(s) to new branch {new_branch}")
+    except Exception as e:
+        logger.error(f"Failed to commit files, error: {e}")
+        raise
+
     return new_branch
 
+
+def push_upload(data: dict, username: str, extra_files: Dict[str, str] = None) -> str:
+    """Commits info.yml and extra files from username to a new branch in one commit, returns the branch"""
+    logger.info(f"Pushing to repository with data from {username}")
+    return commit_files(info_files(data, extra_files), f"Add info.yml from {username}")
+
+@timed_call("github", "create_pull_request")
 def create_pull_request_to_target(
     head_branch: str,
     title: str,
@@ -192,7 +369,6 @@ def create_pull_request_to_target(
     Create PR from head_repo:head_branch into PULL_REQUEST_TARGET_REPO:WORK_BASE_BRANCH.
     Works for same-org fork -> upstream.
     """
-    repo = get_repo_target()  
     payload = {
         "title": title,
         "body": body,
@@ -202,10 +378,58 @@ def create_pull_request_to_target(
         "maintainer_can_modify": False,
     }
 
-    _, data = repo._requester.requestJsonAndCheck("POST", f"{repo.url}/pulls", input=payload)
+    with github_request(PULL_REQUEST_TARGET_REPO, UPLOAD) as repo:
+        _, data = repo._requester.requestJsonAndCheck("POST", f"{repo.url}/pulls", input=payload)
     return data["html_url"]
 
 
+def get_user_login(user_token: str, timeout: float = 10):
+    """
+    Return the GitHub login behind a user's OAuth token, or None if GitHub rejects the token.
+    Cached per token, other GitHub errors are raised and not cached.
+    """
+    @timed_call("github", "user_login")
+    def load():
+        resp = github_session.get(
+            f"{GITHUB_API_URL}/user",
+            headers={"Authorization": f"Bearer {user_token}", "Accept": "application/vnd.github+json"},
+            timeout=timeout,
+        )
+        if resp.status_code == 401:
+            return None
+        if resp.status_code != 200:
+            raise GithubException(resp.status_code, resp.text, dict(resp.headers))
+        return resp.json()["login"]
+    return identity_cache.get_or_load(user_token, "login", load)
+
+
+def get_user_permission(user_token: str) -> str:
+    """
+    Return the permission ("read","write","admin","none") of the token's user
+    on the pull request target repo. Cached per token.
+    """
+    username = get_user_login(user_token)
+    if username is None:
+        return "none"
+
+    @timed_call("github", "user_permission")
+    def load():
+        with github_request(PULL_REQUEST_TARGET_REPO, INTERACTIVE) as repo:
+            logger.info(f"Repository name for permission check: {repo} ")
+            url     = f"{repo.url}/collaborators/{urllib.parse.quote(username, safe='')}/permission"
+            data, _ = conditional_cache.get(PULL_REQUEST_TARGET_REPO, repo._requester, url)
+        perm    = data["permission"]  # "read","write","admin","none"
+        logger.info(f"User {username} has permissions: {perm}")
+        return perm
+    return identity_cache.get_or_load(user_token, "permission", load,
+                                      is_negative=lambda perm: perm not in ("write", "admin"))
+
+
+def forget_user(user_token: str) -> None:
+    """Drop cached identity lookups for a token, e.g. on logout or when it was found invalid."""
+    identity_cache.invalidate(user_token)
+
+
 def user_has_push_access(user_token: str) -> bool:
     """
     Given a user's OAuth token, verify they have write/admin rights
@@ -213,20 +437,19 @@ def user_has_push_access(user_token: str) -> bool:
     """
     #Get username from their token
     try:
-        gh_user = Github(user_token)
-        username = gh_user.get_user().login
+        username = get_user_login(user_token)
     except Exception as e:
         logger.warning(f"Failed to retrieve GitHub user: {e}")
         return False
+    if username is None:
+        logger.warning("Failed to retrieve GitHub user: bad credentials")
+        return False
 
     #Use GitHub to check permission
     try:
-        repo    = get_repo_target()
-        logger.info(f"Repository name for permission check: {repo} ")
-        perm    = repo.get_collaborator_permission(username)  # "read","write","admin","none"
-        logger.info(f"User {username} has permissions: {perm}")
+        perm = get_user_permission(user_token)
     except Exception as e:
         logger.warning(f"Permission check failed for user {username}: {e}")
         return False
 
-    return perm in ("write", "admin")
\ No newline at end of file
+    return perm in ("write", "admin")
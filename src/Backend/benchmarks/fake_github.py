@@ -0,0 +1,270 @@
+"""
+Minimal in-memory stand-in for the parts of the GitHub REST API the gateway uses,
+served over HTTP on localhost so the real PyGithub code paths can be timed.
+
+Every request is counted per "METHOD /route" and can be delayed by a fixed
+latency to approximate the round-trip to api.github.com. GET responses carry
+an ETag and are answered with 304 when If-None-Match matches, like GitHub does.
+Responses report a shared rate limit in X-RateLimit-* headers; 304s don't use
+it, and once it is used up requests are answered with 403 until it resets.
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+import urllib.parse
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def _sha(*parts) -> str:
+    return hashlib.sha1(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+class FakeGitHub:
+    """
+    Fake GitHub API on 127.0.0.1. Repositories are created on first use with
+    a single commit on `main`.
+    """
+
+    def __init__(self, latency: float = 0.0, login: str = "bench-user", permission: str = "write",
+                 rate_limit: int = 5000, rate_window: float = 3600):
+        self.latency = latency
+        self.login = login
+        self.permission = permission
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.rate_used = 0
+        self.rate_reset = time.time() + rate_window
+        self.calls = Counter()
+        self.branches = {}   # (repo, branch) -> commit sha
+        self.commits = {}    # sha -> {"tree": sha, "parents": [...], "message": str}
+        self.trees = {}      # sha -> {path: content}
+        self.pulls = []
+        self._lock = threading.Lock()
+        self._server = None
+        self.url = None
+
+    # Lifecycle
+
+    def start(self) -> "FakeGitHub":
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_port}"
+        threading.Thread(target=self._server.serve_forever, name="fake-github", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_calls(self) -> None:
+        with self._lock:
+            self.calls.clear()
+
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+    def set_rate_remaining(self, remaining: int) -> None:
+        """Pretend the rate limit window has only `remaining` requests left."""
+        with self._lock:
+            self.rate_used = self.rate_limit - remaining
+
+    def _rate_headers(self, counted: bool) -> dict:
+        with self._lock:
+            if time.time() >= self.rate_reset:
+                self.rate_used = 0
+                self.rate_reset = time.time() + self.rate_window
+            if counted:
+                self.rate_used += 1
+            return {
+                "X-RateLimit-Limit": self.rate_limit,
+                "X-RateLimit-Remaining": max(self.rate_limit - self.rate_used, 0),
+                "X-RateLimit-Used": min(self.rate_used, self.rate_limit),
+                "X-RateLimit-Reset": int(self.rate_reset),
+            }
+
+    # State helpers
+
+    def _head(self, repo: str, branch: str) -> str:
+        key = (repo, branch)
+        if key not in self.branches:
+            tree = _sha(repo, "tree")
+            self.trees[tree] = {}
+            commit = _sha(repo, "root")
+            self.commits[commit] = {"tree": tree, "parents": [], "message": "Initial commit"}
+            self.branches[key] = commit
+        return self.branches[key]
+
+    def _repo_json(self, repo: str) -> dict:
+        owner, name = repo.split("/", 1)
+        return {
+            "id": abs(hash(repo)) % 10**8, "name": name, "full_name": repo,
+            "owner": {"login": owner}, "default_branch": "main",
+            "url": f"{self.url}/repos/{repo}", "html_url": f"https://github.com/{repo}",
+        }
+
+    def _commit_json(self, repo: str, sha: str) -> dict:
+        commit = self.commits[sha]
+        tree = {"sha": commit["tree"], "url": f"{self.url}/repos/{repo}/git/trees/{commit['tree']}"}
+        return {
+            "sha": sha, "url": f"{self.url}/repos/{repo}/git/commits/{sha}",
+            "message": commit["message"], "tree": tree,
+            "parents": [{"sha": p} for p in commit["parents"]],
+        }
+
+    # Routes, each returns (status, body)
+
+    def handle(self, method: str, path: str, body: dict):
+        for route_method, pattern, name, func in _ROUTES:
+            match = pattern.fullmatch(path)
+            if route_method == method and match:
+                with self._lock:
+                    self.calls[f"{method} {name}"] += 1
+                if self.latency:
+                    time.sleep(self.latency)
+                with self._lock:
+                    return func(self, body, *match.groups())
+        with self._lock:
+            self.calls[f"{method} {path}"] += 1
+        return 404, {"message": "Not Found"}
+
+    def repo_installation(self, body, repo):
+        return 200, {"id": 1, "app_id": 1}
+
+    def access_token(self, body, installation_id):
+        expires = datetime.now(timezone.utc) + timedelta(hours=1)
+        return 201, {"token": "ghs_fake", "expires_at": expires.strftime("%Y-%m-%dT%H:%M:%SZ")}
+
+    def get_repo(self, body, repo):
+        return 200, self._repo_json(repo)
+
+    def get_ref(self, body, repo, branch):
+        sha = self._head(repo, branch)
+        return 200, {"ref": f"refs/heads/{branch}", "url": f"{self.url}/repos/{repo}/git/refs/heads/{branch}",
+                     "object": {"sha": sha, "type": "commit"}}
+
+    def merge_upstream(self, body, repo):
+        self._head(repo, body.get("branch", "main"))
+        return 200, {"message": "This branch is not behind the upstream", "merge_type": "none",
+                     "base_branch": body.get("branch", "main")}
+
+    def get_branch(self, body, repo, branch):
+        sha = self._head(repo, branch)
+        return 200, {"name": branch, "commit": {
+            "sha": sha, "url": f"{self.url}/repos/{repo}/commits/{sha}",
+            "commit": self._commit_json(repo, sha),
+        }}
+
+    def list_branches(self, body, repo):
+        self._head(repo, "main")
+        names = sorted(branch for r, branch in self.branches if r == repo)
+        per_page, page = int(body.get("per_page", 30)), int(body.get("page", 1))
+        return 200, [{"name": name, "commit": {"sha": self.branches[(repo, name)]}}
+                     for name in names[(page - 1) * per_page:page * per_page]]
+
+    def create_ref(self, body, repo):
+        branch = body["ref"][len("refs/heads/"):]
+        if (repo, branch) in self.branches:
+            return 422, {"message": "Reference already exists"}
+        self.branches[(repo, branch)] = body["sha"]
+        return 201, {"ref": body["ref"], "url": f"{self.url}/repos/{repo}/git/{body['ref']}",
+                     "object": {"sha": body["sha"], "type": "commit"}}
+
+    def put_contents(self, body, repo, path):
+        parent = self._head(repo, body["branch"])
+        files = dict(self.trees[self.commits[parent]["tree"]])
+        files[path] = body["content"]
+        tree = _sha(files)
+        self.trees[tree] = files
+        sha = _sha(tree, parent, body["message"], time.time())
+        self.commits[sha] = {"tree": tree, "parents": [parent], "message": body["message"]}
+        self.branches[(repo, body["branch"])] = sha
+        return 201, {"content": {"path": path, "sha": _sha(body["content"]), "name": path.rsplit("/", 1)[-1]},
+                     "commit": self._commit_json(repo, sha)}
+
+    def create_tree(self, body, repo):
+        files = dict(self.trees.get(body.get("base_tree"), {}))
+        for element in body["tree"]:
+            files[element["path"]] = element.get("content")
+        tree = _sha(files)
+        self.trees[tree] = files
+        return 201, {"sha": tree, "url": f"{self.url}/repos/{repo}/git/trees/{tree}",
+                     "tree": [{"path": path, "type": "blob", "mode": "100644"} for path in files]}
+
+    def create_commit(self, body, repo):
+        sha = _sha(body, time.time())
+        self.commits[sha] = {"tree": body["tree"], "parents": body["parents"], "message": body["message"]}
+        return 201, self._commit_json(repo, sha)
+
+    def create_pull(self, body, repo):
+        self.pulls.append(body)
+        number = len(self.pulls)
+        return 201, {"number": number, "html_url": f"https://github.com/{repo}/pull/{number}"}
+
+    def get_user(self, body):
+        return 200, {"login": self.login, "id": 1}
+
+    def collaborator_permission(self, body, repo, user):
+        return 200, {"permission": self.permission, "user": {"login": user}}
+
+    def check_token(self, body, client_id):
+        return 200, {"token": body.get("access_token"), "user": {"login": self.login}}
+
+
+_REPO = r"/repos/([^/]+/[^/]+)"
+_ROUTES = [(method, re.compile(pattern), name, func) for method, pattern, name, func in (
+    ("GET", _REPO + r"/installation", "/repos/{repo}/installation", FakeGitHub.repo_installation),
+    ("POST", r"/app/installations/([^/]+)/access_tokens", "/app/installations/{id}/access_tokens", FakeGitHub.access_token),
+    ("GET", _REPO, "/repos/{repo}", FakeGitHub.get_repo),
+    ("POST", _REPO + r"/merge-upstream", "/repos/{repo}/merge-upstream", FakeGitHub.merge_upstream),
+    ("GET", _REPO + r"/git/ref/heads/(.+)", "/repos/{repo}/git/ref/heads/{branch}", FakeGitHub.get_ref),
+    ("GET", _REPO + r"/branches", "/repos/{repo}/branches", FakeGitHub.list_branches),
+    ("GET", _REPO + r"/branches/(.+)", "/repos/{repo}/branches/{branch}", FakeGitHub.get_branch),
+    ("POST", _REPO + r"/git/refs", "/repos/{repo}/git/refs", FakeGitHub.create_ref),
+    ("PUT", _REPO + r"/contents/(.+)", "/repos/{repo}/contents/{path}", FakeGitHub.put_contents),
+    ("POST", _REPO + r"/git/trees", "/repos/{repo}/git/trees", FakeGitHub.create_tree),
+    ("POST", _REPO + r"/git/commits", "/repos/{repo}/git/commits", FakeGitHub.create_commit),
+    ("POST", _REPO + r"/pulls", "/repos/{repo}/pulls", FakeGitHub.create_pull),
+    ("GET", r"/user", "/user", FakeGitHub.get_user),
+    ("GET", _REPO + r"/collaborators/([^/]+)/permission", "/repos/{repo}/collaborators/{user}/permission",
+     FakeGitHub.collaborator_permission),
+    ("POST", r"/applications/([^/]+)/token", "/applications/{client_id}/token", FakeGitHub.check_token),
+)]
+
+
+def _make_handler(fake: FakeGitHub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _dispatch(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            raw = self.rfile.read(length) if length else b""
+            path, _, query = self.path.partition("?")
+            body = json.loads(raw) if raw else dict(urllib.parse.parse_qsl(query))
+            if fake.rate_used >= fake.rate_limit and time.time() < fake.rate_reset:
+                status, data = 403, {"message": "API rate limit exceeded"}
+            else:
+                status, data = fake.handle(self.command, path, body)
+            out = json.dumps(data).encode("utf-8")
+            etag = f'"{hashlib.sha1(out).hexdigest()}"'
+            if self.command == "GET" and status == 200 and self.headers.get("If-None-Match") == etag:
+                status, out = 304, b""
+            self.send_response(status)
+            for name, value in fake._rate_headers(counted=status not in (304, 403)).items():
+                self.send_header(name, str(value))
+            if self.command == "GET" and status in (200, 304):
+                self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _dispatch
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
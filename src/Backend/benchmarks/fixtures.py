@@ -0,0 +1,199 @@
+"""
+Builds a small, reproducible stand-in for the Databank (FAIRMD_lipids) and
+BilayerData checkouts the Databank API runs on.
+
+The fixture Databank is a git repo with a minimal `fairmd.lipids` package that
+offers exactly what databank_api imports: FMDL_MOL_PATH, the molecule sets, the
+info file schema with validate_info_dict and the date error filter of
+validate_yaml, and the config check. The BilayerData fixture has membrane and
+solution molecules with mapping files, and Simulations/**/info.yml files of
+which a share is deliberately invalid. Both are cloned from local bare
+"origin" repos so the API's git pulls work as in production.
+"""
+import json
+import os
+import random
+import subprocess
+
+import yaml
+
+SOFTWARE = ("gromacs", "openMM", "NAMD", "CHARMM")
+
+INFO_SCHEMA = {
+    "$schema": "http://json-schema.org/draft-07/schema#",
+    "type": "object",
+    "required": ["DOI", "SOFTWARE", "TRJ", "TPR", "COMPOSITION", "TEMPERATURE"],
+    "properties": {
+        "DOI": {"type": "string", "pattern": r"^10\.\d{4,9}/\S+$"},
+        "SOFTWARE": {"type": "string", "enum": list(SOFTWARE)},
+        "TRJ": {"type": "string", "minLength": 1},
+        "TPR": {"type": "string", "minLength": 1},
+        "TEMPERATURE": {"type": "number", "minimum": 200, "maximum": 400},
+        "DATEOFRUNNING": {"type": "string"},
+        "AUTHORS_CONTACT": {"type": "string"},
+        "COMPOSITION": {
+            "type": "object",
+            "minProperties": 1,
+            "additionalProperties": {
+                "type": "object",
+                "required": ["NAME", "MAPPING"],
+                "properties": {
+                    "NAME": {"type": "string"},
+                    "MAPPING": {"type": "string", "pattern": r"^mapping.*\.yaml$"},
+                    "COUNT": {"type": "array", "items": {"type": "integer", "minimum": 0}},
+                },
+            },
+        },
+    },
+}
+
+PACKAGE_FILES = {
+    "pyproject.toml": """\
+[project]
+name = "fairmd-lipids"
+version = "0.0.0"
+""",
+    "fairmd/__init__.py": "",
+    "fairmd/lipids/__init__.py": """\
+import os
+
+FMDL_DATA_PATH = os.environ["FMDL_DATA_PATH"]
+FMDL_MOL_PATH = os.path.join(FMDL_DATA_PATH, "Molecules")
+""",
+    "fairmd/lipids/molecules.py": """\
+import os
+
+from fairmd.lipids import FMDL_MOL_PATH
+
+
+class MoleculeSet:
+    def __init__(self, folder):
+        path = os.path.join(FMDL_MOL_PATH, folder)
+        self.names = {entry.name for entry in os.scandir(path) if entry.is_dir()}
+
+
+lipids_set = MoleculeSet("membrane")
+molecules_set = MoleculeSet("solution")
+""",
+    "fairmd/lipids/schema_validation/__init__.py": "",
+    "fairmd/lipids/schema_validation/validate_yaml.py": """\
+import datetime
+import json
+import os
+
+from jsonschema import Draft7Validator, FormatChecker
+
+default_info_schema_path = os.path.join(os.path.dirname(__file__), "info_schema.json")
+
+
+def _filter_yaml_date_string_type_errors(errors):
+    return [e for e in errors
+            if not (e.validator == "type" and "string" in e.validator_value
+                    and isinstance(e.instance, (datetime.date, datetime.datetime)))]
+
+
+def validate_info_dict(instance, schema_path=default_info_schema_path):
+    with open(schema_path, encoding="utf-8") as f:
+        schema = json.load(f)
+    validator = Draft7Validator(schema, format_checker=FormatChecker())
+    return _filter_yaml_date_string_type_errors(list(validator.iter_errors(instance)))
+""",
+    "fairmd/lipids/schema_validation/validate_info_dict.py": """\
+from fairmd.lipids import molecules
+
+
+def parse_valid_config_settings(info, logger):
+    known = molecules.lipids_set.names | molecules.molecules_set.names
+    for key in info.get("COMPOSITION", {}):
+        if key not in known:
+            raise KeyError(f"Molecule {key} in COMPOSITION is not in the Databank")
+    return info
+""",
+}
+
+
+def _git(cwd: str, *args) -> None:
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def _publish(root: str, name: str, source: str) -> str:
+    """Commit source as a bare origin repo and return a clone of it."""
+    _git(source, "init", "-q", "-b", "main")
+    _git(source, "add", "-A")
+    _git(source, "-c", "user.name=bench", "-c", "user.email=bench@localhost", "commit", "-q", "-m", "fixture")
+    origin = os.path.join(root, "origin", f"{name}.git")
+    subprocess.run(["git", "clone", "-q", "--bare", source, origin], check=True)
+    clone = os.path.join(root, name)
+    subprocess.run(["git", "clone", "-q", origin, clone], check=True)
+    return clone
+
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def make_info(rng: random.Random, lipids: list, solution: list, valid: bool = True) -> dict:
+    """A random info dict over the fixture molecules. Invalid ones break the schema or the config check."""
+    composition = {}
+    for name in rng.sample(lipids, k=min(len(lipids), rng.randint(1, 3))) + rng.sample(solution, k=1):
+        composition[name] = {"NAME": name, "MAPPING": f"mapping{name}.yaml", "COUNT": [rng.randint(1, 300)] * 2}
+    info = {
+        "DOI": f"10.5281/zenodo.{rng.randint(10**6, 10**7)}",
+        "SOFTWARE": rng.choice(SOFTWARE),
+        "TRJ": f"run{rng.randint(0, 999)}.xtc",
+        "TPR": "topol.tpr",
+        "TEMPERATURE": rng.choice((298, 303, 310, 323)),
+        "AUTHORS_CONTACT": "bench@localhost",
+        "COMPOSITION": composition,
+    }
+    if not valid:
+        breakage = rng.choice(("schema", "config"))
+        if breakage == "schema":
+            info["TEMPERATURE"] = "hot"
+            info["SOFTWARE"] = "unknown"
+        else:
+            info["COMPOSITION"]["NOTAMOLECULE"] = {"NAME": "X", "MAPPING": "mappingX.yaml"}
+    return info
+
+
+def build(root: str, molecules: int = 60, mappings_per_molecule: int = 3, simulations: int = 200,
+          invalid_share: float = 0.1, seed: int = 1) -> dict:
+    """
+    Create the fixture below root. Returns {"databank", "bilayerdata", "infos"} where
+    infos is the list of generated info dicts (valid and invalid).
+    """
+    rng = random.Random(seed)
+    os.makedirs(root, exist_ok=True)
+
+    source = os.path.join(root, "src", "Databank")
+    for path, text in PACKAGE_FILES.items():
+        _write(os.path.join(source, path), text)
+    _write(os.path.join(source, "fairmd/lipids/schema_validation/info_schema.json"), json.dumps(INFO_SCHEMA, indent=2))
+
+    source_data = os.path.join(root, "src", "BilayerData")
+    n_solution = max(2, molecules // 6)
+    lipids = [f"L{i:03d}{rng.choice('PCESG')}" for i in range(molecules - n_solution)]
+    solution = [f"S{i:02d}" for i in range(n_solution)]
+    for category, names in (("membrane", lipids), ("solution", solution)):
+        for name in names:
+            for j in range(mappings_per_molecule):
+                suffix = "" if j == 0 else f"_{j}"
+                _write(os.path.join(source_data, "Molecules", category, name, f"mapping{name}{suffix}.yaml"),
+                       yaml.safe_dump({f"M_{name}_{k}_M": {"ATOMNAME": f"A{k}", "RESIDUE": name} for k in range(20)}))
+
+    infos = []
+    for i in range(simulations):
+        info = make_info(rng, lipids, solution, valid=rng.random() >= invalid_share)
+        infos.append(info)
+        _write(os.path.join(source_data, "Simulations", f"{i // 50:02d}", f"{i:04d}", "info.yml"),
+               yaml.safe_dump(info, sort_keys=False))
+
+    return {
+        "databank": _publish(root, "Databank", source),
+        "bilayerdata": _publish(root, "BilayerData", source_data),
+        "infos": infos,
+        "lipids": lipids,
+        "solution": solution,
+    }
@@ -0,0 +1,331 @@
+"""
+Load test of the Databank API and the GitHub gateway against local fakes.
+
+Builds the fixture Databank and BilayerData trees (fixtures.py), starts the fake
+GitHub server (fake_github.py), runs both Flask apps as subprocesses (gunicorn
+with their own gunicorn_config.py, or werkzeug's threaded server when gunicorn
+isn't installed) and drives a weighted mix of requests from concurrent clients.
+
+Reports throughput and p50/p95/p99 latency per endpoint, saves them as JSON and,
+given a baseline, exits with 1 when an endpoint got slower than the tolerance:
+
+    python benchmarks/load_test.py --duration 30 --concurrency 16
+    python benchmarks/load_test.py --baseline benchmarks/results/baseline.json
+"""
+import argparse
+import importlib.util
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BACKEND = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+from fake_github import FakeGitHub  # noqa: E402
+from upload_benchmark import gateway_env  # noqa: E402
+
+DEFAULT_MIX = "molecules=35,mapping-files=25,info-valid-check=30,upload=10"
+
+WERKZEUG_RUNNER = """\
+import sys
+from werkzeug.serving import run_simple
+module = __import__(sys.argv[1])
+run_simple("127.0.0.1", int(sys.argv[2]), module.app, threaded=True)
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Service:
+    """One of the Flask apps running in a subprocess on a free local port."""
+
+    def __init__(self, name: str, directory: str, module: str, env: dict, server: str, log_dir: str):
+        self.name = name
+        self.port = free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        if server == "gunicorn":
+            cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn_config.py",
+                   "--bind", f"127.0.0.1:{self.port}", f"{module}:app"]
+        else:
+            cmd = [sys.executable, "-c", WERKZEUG_RUNNER, module, str(self.port)]
+        self._log = open(os.path.join(log_dir, f"{name}.log"), "w")
+        self.process = subprocess.Popen(cmd, cwd=directory, env={**os.environ, **env},
+                                        stdout=self._log, stderr=subprocess.STDOUT)
+
+    def wait_until(self, path: str, timeout: float = 120) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"{self.name} exited, see {self._log.name}")
+            try:
+                if requests.get(self.url + path, timeout=2).status_code == 200:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.2)
+        raise TimeoutError(f"{self.name} not answering {path} after {timeout} s, see {self._log.name}")
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+        self._log.close()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(q / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+class LoadDriver:
+    """Runs `concurrency` client threads for `duration` seconds, each picking endpoints by weight."""
+
+    def __init__(self, databank_url: str, gateway_url: str, fixture: dict, mix: dict, seed: int):
+        self.databank_url = databank_url
+        self.gateway_url = gateway_url
+        self.fixture = fixture
+        self.mix = mix
+        self.seed = seed
+        self.samples = {name: [] for name in mix}
+        self.errors = {name: 0 for name in mix}
+        self.upload_jobs = []
+        self._lock = threading.Lock()
+
+    def _request(self, session: requests.Session, rng: random.Random, endpoint: str) -> bool:
+        molecules = self.fixture["lipids"] + self.fixture["solution"]
+        if endpoint == "molecules":
+            resp = session.get(f"{self.databank_url}/molecules")
+        elif endpoint == "mapping-files":
+            resp = session.get(f"{self.databank_url}/mapping-files")
+        elif endpoint == "mapping-files/<molecule>":
+            resp = session.get(f"{self.databank_url}/mapping-files/{rng.choice(molecules)}")
+        elif endpoint == "mapping-files/<molecule>/<filename>":
+            molecule = rng.choice(molecules)
+            resp = session.get(f"{self.databank_url}/mapping-files/{molecule}/mapping{molecule}.yaml")
+        elif endpoint == "molecules/search":
+            resp = session.get(f"{self.databank_url}/molecules/search", params={"q": rng.choice(molecules)[:3]})
+        elif endpoint == "info-valid-check":
+            resp = session.post(f"{self.databank_url}/info-valid-check", json=rng.choice(self.fixture["infos"]))
+            return resp.status_code in (200, 400)
+        elif endpoint == "upload":
+            info = fixtures.make_info(rng, self.fixture["lipids"], self.fixture["solution"])
+            resp = session.post(f"{self.gateway_url}/upload", headers={"Authorization": "Bearer bench-token"},
+                                json={**info, "userName": "bench-user", "branch": "main"})
+            if resp.status_code == 202:
+                with self._lock:
+                    self.upload_jobs.append(resp.json()["jobId"])
+            return resp.status_code == 202
+        else:
+            raise ValueError(f"Unknown endpoint {endpoint}")
+        return resp.status_code == 200
+
+    def _client(self, index: int, deadline: float) -> None:
+        rng = random.Random(self.seed + index)
+        names, weights = zip(*self.mix.items())
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                ok = self._request(session, rng, endpoint)
+            except requests.RequestException:
+                ok = False
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.samples[endpoint].append(elapsed)
+                if not ok:
+                    self.errors[endpoint] += 1
+
+    def run(self, concurrency: int, duration: float) -> float:
+        deadline = time.monotonic() + duration
+        start = time.perf_counter()
+        threads = [threading.Thread(target=self._client, args=(i, deadline)) for i in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return time.perf_counter() - start
+
+    def report(self, elapsed: float) -> dict:
+        endpoints = {}
+        for name, samples in self.samples.items():
+            latencies = sorted(samples)
+            endpoints[name] = {
+                "requests": len(latencies),
+                "errors": self.errors[name],
+                "throughput_rps": round(len(latencies) / elapsed, 2),
+                **{f"p{q}_ms": round(percentile(latencies, q) * 1000, 3) if latencies else None
+                   for q in (50, 95, 99)},
+                "max_ms": round(latencies[-1] * 1000, 3) if latencies else None,
+            }
+        total = sum(len(samples) for samples in self.samples.values())
+        return {"elapsed_s": round(elapsed, 3), "throughput_rps": round(total / elapsed, 2), "endpoints": endpoints}
+
+    def wait_for_uploads(self, timeout: float) -> dict:
+        """Poll the queued uploads until they finished or timeout passed, return counts per state."""
+        session = requests.Session()
+        start = time.perf_counter()
+        deadline = time.monotonic() + timeout
+        states = {}
+        while True:
+            states = {}
+            for job_id in self.upload_jobs:
+                resp = session.get(f"{self.gateway_url}/upload-status/{job_id}")
+                state = resp.json().get("state", "unknown") if resp.ok else "unknown"
+                states[state] = states.get(state, 0) + 1
+            if not states.keys() - {"succeeded", "failed"} or time.monotonic() > deadline:
+                break
+            time.sleep(0.5)
+        return {"jobs": len(self.upload_jobs), "states": states, "drain_s": round(time.perf_counter() - start, 3)}
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight)
+    return {name: weight for name, weight in mix.items() if weight > 0}
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """Endpoints whose p95 grew or throughput shrank by more than tolerance relative to baseline."""
+    regressions = []
+    for name, current in result["endpoints"].items():
+        before = baseline["endpoints"].get(name)
+        if not before or not before.get("p95_ms") or not current.get("p95_ms"):
+            continue
+        if current["p95_ms"] > before["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {before['p95_ms']} ms -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < before["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return regressions
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of load")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent clients")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Endpoint weights; also mapping-files/<molecule>, "
+                             "mapping-files/<molecule>/<filename> and molecules/search")
+    parser.add_argument("--server", choices=("gunicorn", "werkzeug"),
+                        default="gunicorn" if importlib.util.find_spec("gunicorn") else "werkzeug")
+    parser.add_argument("--github-latency-ms", type=float, default=50, help="Simulated GitHub round-trip")
+    parser.add_argument("--molecules", type=int, default=60)
+    parser.add_argument("--simulations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--upload-timeout", type=float, default=120, help="Seconds to wait for queued uploads")
+    parser.add_argument("--output", default=None, help="Result file, default benchmarks/results/<timestamp>.json")
+    parser.add_argument("--baseline", default=None, help="Earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative regression")
+    parser.add_argument("--keep", action="store_true", help="Keep the fixture directory and service logs")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="nmrlipids-load-")
+    print(f"Building fixtures in {workdir}")
+    fixture = fixtures.build(os.path.join(workdir, "fixture"), molecules=args.molecules,
+                             simulations=args.simulations, seed=args.seed)
+    fake = FakeGitHub(latency=args.github_latency_ms / 1000).start()
+
+    gateway_port = free_port()
+    common = {
+        "PYTHONPATH": os.pathsep.join([BACKEND, fixture["databank"]]),
+        "GUNICORN_WORKERS": os.getenv("GUNICORN_WORKERS", "2"),
+    }
+    services = []
+    try:
+        databank = Service("databank_api", os.path.join(BACKEND, "Databank_api"), "databank_api", {
+            **common,
+            "BILAYERDATA_PATH": fixture["bilayerdata"],
+            "FMDL_DATA_PATH": fixture["bilayerdata"],
+            "DATABANK_PATH": fixture["databank"],
+            "LOCAL_STATIC": os.path.join(workdir, "static"),
+            "GITHUB_GATEWAY_URL": f"http://127.0.0.1:{gateway_port}",
+        }, args.server, workdir)
+        services.append(databank)
+        gateway = Service("github_gateway", os.path.join(BACKEND, "Github_Gateway"), "app", {
+            **common,
+            **gateway_env(fake.url),
+            "OAUTH_ID": "bench-oauth", "OAUTH_SECRET": "bench-secret",
+            "DATABANK_API_URL": databank.url,
+            "UPLOAD_QUEUE_DB": os.path.join(workdir, "upload_jobs.sqlite3"),
+        }, args.server, workdir)
+        services.append(gateway)
+        databank.wait_until("/ready")
+        gateway.wait_until("/awake")
+
+        print(f"Running {args.concurrency} clients for {args.duration:.0f} s against {args.server} servers")
+        driver = LoadDriver(databank.url, gateway.url, fixture, parse_mix(args.mix), args.seed)
+        elapsed = driver.run(args.concurrency, args.duration)
+        result = driver.report(elapsed)
+        if driver.upload_jobs:
+            result["uploads"] = driver.wait_for_uploads(args.upload_timeout)
+        result["github_calls"] = dict(fake.calls)
+    finally:
+        for service in services:
+            service.stop()
+        fake.stop()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    result["meta"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "server": args.server,
+        "args": vars(args),
+    }
+
+    print(f"\n{'endpoint':<38}{'requests':>9}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for name, r in result["endpoints"].items():
+        print(f"{name:<38}{r['requests']:>9}{r['errors']:>8}{r['throughput_rps']:>9}"
+              f"{r['p50_ms'] or '-':>9}{r['p95_ms'] or '-':>9}{r['p99_ms'] or '-':>9}")
+    print(f"\nTotal throughput: {result['throughput_rps']} req/s")
+    if "uploads" in result:
+        print(f"Uploads: {result['uploads']}")
+
+    output = args.output or os.path.join(HERE, "results", f"{result['meta']['timestamp'].replace(':', '')}.json")
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print("\nRegressions against baseline:\n  " + "\n  ".join(regressions))
+            sys.exit(1)
+        print("\nNo regressions against baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Latency waterfalls of traces exported by the backend services.
+
+Reads the span files written with TRACE_EXPORT_FILE set (one JSON span per line,
+the files of several services and workers can be given together), joins the spans
+by trace id and prints each trace as a tree of spans with their start offset,
+duration and a bar on a common time axis:
+
+    python benchmarks/trace_waterfall.py gateway-spans.jsonl databank-spans.jsonl
+    python benchmarks/trace_waterfall.py spans.jsonl --trace 4bf92f35
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+def load_spans(paths: list) -> dict:
+    """Spans of the files grouped by trace id. Unparseable lines are skipped."""
+    traces = defaultdict(list)
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    span = json.loads(line)
+                except ValueError:
+                    continue
+                if span.get("trace_id") and span.get("duration_ms") is not None:
+                    traces[span["trace_id"]].append(span)
+    return traces
+
+
+def trace_extent(spans: list) -> tuple:
+    """(start, end) in seconds of all spans of a trace."""
+    start = min(span["start"] for span in spans)
+    end = max(span["start"] + span["duration_ms"] / 1000 for span in spans)
+    return start, end
+
+
+def render(trace_id: str, spans: list, width: int) -> list:
+    start, end = trace_extent(spans)
+    total_ms = max((end - start) * 1000, 0.001)
+    ids = {span["span_id"] for span in spans}
+    children = defaultdict(list)
+    for span in spans:
+        # Spans whose parent wasn't exported (e.g. the caller wasn't traced) are shown as roots
+        children[span["parent_id"] if span["parent_id"] in ids else None].append(span)
+    for siblings in children.values():
+        siblings.sort(key=lambda span: span["start"])
+
+    lines = [f"trace {trace_id}  {total_ms:.1f} ms  {len(spans)} spans"]
+
+    def walk(parent_id, depth):
+        for span in children.get(parent_id, ()):
+            offset_ms = (span["start"] - start) * 1000
+            left = int(offset_ms / total_ms * width)
+            length = max(int(span["duration_ms"] / total_ms * width), 1)
+            bar = " " * left + "#" * min(length, width - left)
+            label = "  " * depth + f"{span['name']} [{span.get('service', '?')}]"
+            if span.get("status") == "error":
+                label += " !"
+            lines.append(f"  {label:<56.56} {offset_ms:>9.1f} {span['duration_ms']:>9.1f}  |{bar:<{width}}|")
+            walk(span["span_id"], depth + 1)
+
+    walk(None, 0)
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("files", nargs="+", help="Span files written by the services")
+    parser.add_argument("--trace", default=None, help="Only traces whose id or request id starts with this")
+    parser.add_argument("--slowest", type=int, default=5, help="Number of traces to show, slowest first")
+    parser.add_argument("--width", type=int, default=50, help="Width of the time axis in characters")
+    args = parser.parse_args()
+
+    traces = load_spans(args.files)
+    if args.trace:
+        prefix = args.trace.lower()
+        traces = {trace_id: spans for trace_id, spans in traces.items()
+                  if trace_id.startswith(prefix) or any(str(span.get("request_id", "")).lower().startswith(prefix)
+                                                        for span in spans)}
+    if not traces:
+        sys.exit("No matching traces found")
+
+    def duration(item):
+        start, end = trace_extent(item[1])
+        return end - start
+
+    print(f"  {'span [service]':<56} {'start ms':>9} {'ms':>9}")
+    for trace_id, spans in sorted(traces.items(), key=duration, reverse=True)[:args.slowest]:
+        print("\n".join(render(trace_id, spans, args.width)))
+
+
+if __name__ == "__main__":
+    main()
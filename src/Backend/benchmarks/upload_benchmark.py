@@ -0,0 +1,120 @@
+"""
+Compares the GitHub side of an upload done with the Contents API (get branch,
+create ref, one create_file per file) against utils.commit_files, which writes
+all files in one commit through the Git Data API, using a local fake GitHub server.
+
+Reports GitHub requests per upload and end-to-end latency (sync, commit and
+pull request) for both. PyGithub spaces write requests at least one second
+apart by default, so every saved write saves about a second. Run from
+src/Backend with the gateway requirements installed:
+
+    python benchmarks/upload_benchmark.py --uploads 20 --latency-ms 80 --extra-files 2
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+sys.path.insert(0, os.path.dirname(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "Github_Gateway"))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_github import FakeGitHub  # noqa: E402
+
+INFO = {
+    "DOI": "10.5281/zenodo.0000000",
+    "SOFTWARE": "gromacs",
+    "TRJ": "traj.xtc",
+    "TPR": "topol.tpr",
+    "COMPOSITION": {"POPC": {"NAME": "POPC", "MAPPING": "mappingPOPC.yaml"}},
+}
+
+
+def gateway_env(api_url: str) -> dict:
+    """Environment pointing the gateway's GitHub clients at the fake server, with a throwaway app key."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.TraditionalOpenSSL, serialization.NoEncryption()
+    ).decode()
+    return {
+        "GITHUB_API_URL": api_url,
+        "WORK_REPO_NAME": "bench/work",
+        "PULL_REQUEST_TARGET_REPO": "bench/target",
+        "HELPER_APP_ID": "1", "HELPER_PRIVATE_KEY": key,
+        "ADMIN_APP_ID": "2", "ADMIN_PRIVATE_KEY": key,
+    }
+
+
+def configure_gateway_env(api_url: str) -> None:
+    os.environ.update(gateway_env(api_url))
+
+
+def contents_api_upload(utils, files: dict, username: str) -> str:
+    """The previous path: branch off, then one create_file request (and commit) per file."""
+    utils.sync_upstream()
+    branch = utils.branch_out(utils.WORK_BASE_BRANCH)
+    for path, content in files.items():
+        utils.get_repo_work().create_file(path=path, message=f"Add {path} from {username}",
+                                          content=content, branch=branch)
+    return utils.create_pull_request_to_target(head_branch=branch, title="bench")
+
+
+def git_data_api_upload(utils, files: dict, username: str) -> str:
+    utils.sync_upstream()
+    branch = utils.commit_files(files, f"Add info.yml from {username}")
+    return utils.create_pull_request_to_target(head_branch=branch, title="bench")
+
+
+def run(name: str, upload, utils, fake: FakeGitHub, files: dict, uploads: int) -> dict:
+    fake.reset_calls()
+    timings = []
+    for _ in range(uploads):
+        start = time.perf_counter()
+        upload(utils, files, "bench-user")
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "name": name,
+        "calls": fake.total_calls() / uploads,
+        "by_route": {route: count / uploads for route, count in sorted(fake.calls.items())},
+        "mean_ms": statistics.mean(timings),
+        "median_ms": statistics.median(timings),
+        "max_ms": max(timings),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--uploads", type=int, default=20, help="Uploads per path")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Simulated GitHub round-trip per request")
+    parser.add_argument("--extra-files", type=int, default=1, help="Files committed next to info.yml")
+    args = parser.parse_args()
+
+    fake = FakeGitHub(latency=args.latency_ms / 1000).start()
+    configure_gateway_env(fake.url)
+    import utils  # noqa: E402, reads the environment at import
+
+    files = utils.info_files(INFO, {f"README_{i}.md": f"Extra file {i}\n" for i in range(args.extra_files)})
+    utils.get_repo_work(), utils.get_repo_target()  # mint tokens before timing
+
+    results = [
+        run("contents API", contents_api_upload, utils, fake, files, args.uploads),
+        run("commit_files", git_data_api_upload, utils, fake, files, args.uploads),
+    ]
+    fake.stop()
+
+    print(f"{args.uploads} uploads of {len(files)} files, {args.latency_ms:.0f} ms simulated latency per request")
+    for r in results:
+        print(f"\n{r['name']:>14}: {r['calls']:.1f} requests/upload, "
+              f"mean {r['mean_ms']:.1f} ms, median {r['median_ms']:.1f} ms, max {r['max_ms']:.1f} ms")
+        for route, count in r["by_route"].items():
+            print(f"{'':>16}{count:>4.1f}  {route}")
+    old, new = results
+    print(f"\nSpeedup: {old['mean_ms'] / new['mean_ms']:.2f}x, "
+          f"{old['calls'] - new['calls']:.1f} fewer requests per upload")
+
+
+if __name__ == "__main__":
+    main()
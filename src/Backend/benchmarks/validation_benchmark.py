@@ -0,0 +1,100 @@
+"""
+Compares per-request info.yml schema validation latency of the Databank's
+validate_info_dict (schema loaded and compiled on every call) with the
+precompiled validator used by databank_api.
+
+Run from src/Backend in an environment with the Databank installed and
+FMDL_DATA_PATH pointing to a BilayerData checkout, or on the generated
+fixture Databank and BilayerData (fixtures.py):
+
+    python benchmarks/validation_benchmark.py --data $FMDL_DATA_PATH --repeat 5
+    python benchmarks/validation_benchmark.py --fixture
+"""
+import argparse
+import atexit
+import glob
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import yaml
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "Databank_api"))
+sys.path.insert(0, HERE)
+
+import fixtures  # noqa: E402
+from schema_validator import InfoSchemaValidator  # noqa: E402
+
+
+def load_corpus(data_path: str, pattern: str) -> list:
+    """Load every info file matching pattern below data_path as a dict."""
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(data_path, pattern), recursive=True)):
+        with open(path, encoding="utf-8") as f:
+            info = yaml.safe_load(f)
+        if isinstance(info, dict) and info:
+            corpus.append(info)
+    return corpus
+
+
+def time_per_call(func, corpus: list, repeat: int) -> list:
+    """Return the latency in milliseconds of every func(info) call."""
+    timings = []
+    for _ in range(repeat):
+        for info in corpus:
+            start = time.perf_counter()
+            func(info)
+            timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def summarize(name: str, timings: list) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[int(len(ordered) * 0.95) - 1] if len(ordered) > 1 else ordered[0]
+    print(f"{name:<24} n={len(ordered):<6} mean={statistics.mean(ordered):8.3f} ms  "
+          f"p50={statistics.median(ordered):8.3f} ms  p95={p95:8.3f} ms")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data", default=os.getenv("BILAYERDATA_PATH", "/app/BilayerData"),
+                        help="BilayerData checkout to take the info files from")
+    parser.add_argument("--pattern", default="**/info*.yml", help="Glob of info files below --data")
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the corpus per validator")
+    parser.add_argument("--fixture", action="store_true",
+                        help="Build the fixture Databank and BilayerData and validate their info files")
+    args = parser.parse_args()
+
+    if args.fixture:
+        workdir = tempfile.mkdtemp(prefix="nmrlipids-validation-")
+        atexit.register(shutil.rmtree, workdir, True)
+        fixture = fixtures.build(os.path.join(workdir, "fixture"))
+        os.environ["FMDL_DATA_PATH"] = args.data = fixture["bilayerdata"]
+        sys.path.insert(0, fixture["databank"])
+    # Imported after --fixture may have put the fixture Databank on the path
+    from fairmd.lipids.schema_validation.validate_yaml import validate_info_dict
+
+    corpus = load_corpus(args.data, args.pattern)
+    if not corpus:
+        print(f"No info files matching {args.pattern} below {args.data}")
+        return 1
+    print(f"Validating {len(corpus)} info files, {args.repeat} passes each")
+
+    summarize("validate_info_dict", time_per_call(validate_info_dict, corpus, args.repeat))
+
+    compiled = InfoSchemaValidator()
+    start = time.perf_counter()
+    compiled.reload()
+    print(f"Compiling and checking the validator took {(time.perf_counter() - start) * 1000:.3f} ms (once per refresh)")
+    if compiled.delegating:
+        print("The precompiled validator disagrees with validate_info_dict and delegates to it")
+    summarize("precompiled validator", time_per_call(compiled.validate, corpus, args.repeat))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keep-alive connections kept per host, and retries of failed connects and 502/503/504 answers
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF = float(os.getenv("HTTP_RETRY_BACKOFF", "0.3"))
+
+_sessions = {}
+_lock = threading.Lock()
+
+
+def pooled_session(name: str, pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES,
+                   backoff: float = HTTP_RETRY_BACKOFF) -> requests.Session:
+    """
+    Return the process wide requests.Session registered under name, creating it on first use.
+
+    The session keeps up to pool_size keep-alive connections per host, so calls between
+    the services and to GitHub reuse TCP/TLS connections instead of opening one per request.
+    Connection errors and 502/503/504 answers are retried with exponential backoff;
+    the calls made through these sessions are all safe to repeat.
+    """
+    with _lock:
+        session = _sessions.get(name)
+        if session is None:
+            retry = Retry(
+                total=retries,
+                read=0,
+                backoff_factor=backoff,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset({"GET", "POST"}),
+                raise_on_status=False,
+            )
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+            session = requests.Session()
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[name] = session
+        return session
+
+
+def session_stats() -> dict:
+    """Per session and host: connections opened, requests sent over them, and how many of those reused a connection."""
+    out = {}
+    with _lock:
+        sessions = dict(_sessions)
+    for name, session in sessions.items():
+        hosts = {}
+        for adapter in set(session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                hosts[f"{key.key_scheme}://{key.key_host}:{key.key_port}"] = {
+                    "connections": pool.num_connections,
+                    "requests": pool.num_requests,
+                    "reused": pool.num_requests - pool.num_connections,
+                }
+        out[name] = hosts
+    return out
@@ -0,0 +1,132 @@
+import os
+import threading
+import time
+
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+# Seconds between samples of the sampled metrics in every worker
+METRICS_SAMPLE_INTERVAL = float(os.getenv("METRICS_SAMPLE_INTERVAL", "15"))
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_sampled = []
+_sampler = {"thread": None}
+_sampler_lock = threading.Lock()
+
+
+class Sampled:
+    """
+    A Gauge or Counter whose values are read from func() instead of being updated where
+    things happen. func returns a number or {label values tuple: number}. Gauges are set
+    to the values; for counters func returns the counts of this process so far and the
+    counter is increased by the difference to the previous sample.
+    """
+
+    def __init__(self, metric, func):
+        self.metric = metric
+        self._func = func
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def sample(self) -> None:
+        try:
+            values = self._func()
+        except Exception:
+            return
+        if not isinstance(values, dict):
+            values = {(): values}
+        with self._lock:
+            for key, value in values.items():
+                if value is None:
+                    continue
+                key = key if isinstance(key, tuple) else (key,)
+                child = self.metric.labels(*key) if key else self.metric
+                if isinstance(self.metric, Counter):
+                    # Counts that dropped (e.g. a cleared cache) start over from the new value
+                    delta = value - self._last.get(key, 0)
+                    if delta > 0:
+                        child.inc(delta)
+                    self._last[key] = value
+                else:
+                    child.set(value)
+
+
+def sampled(metric, func) -> Sampled:
+    """Register metric to be sampled from func() before every scrape and every METRICS_SAMPLE_INTERVAL seconds."""
+    entry = Sampled(metric, func)
+    _sampled.append(entry)
+    return entry
+
+
+def sample_all() -> None:
+    for entry in list(_sampled):
+        entry.sample()
+
+
+def _start_sampler() -> None:
+    """
+    Sample in a thread of every worker, so the values of workers that don't answer
+    the scrape are current as well. Started on the first request, after gunicorn forked.
+    """
+    with _sampler_lock:
+        if _sampler["thread"] is not None:
+            return
+
+        def loop():
+            while True:
+                sample_all()
+                time.sleep(METRICS_SAMPLE_INTERVAL)
+
+        _sampler["thread"] = threading.Thread(target=loop, name="metrics-sampler", daemon=True)
+        _sampler["thread"].start()
+
+
+def render() -> bytes:
+    """
+    Metrics in Prometheus text format. With PROMETHEUS_MULTIPROC_DIR set (see the
+    gunicorn configs) they are aggregated over all workers, otherwise they are the
+    ones of this process.
+    """
+    sample_all()
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def instrument_app(app) -> None:
+    """
+    Time every request of app per route, method and status, track requests in
+    flight and serve the metrics in Prometheus text format at /metrics.
+    """
+    latency = Histogram("http_request_duration_seconds", "Request latency per route",
+                        ("route", "method", "status"), buckets=DEFAULT_BUCKETS)
+    in_flight = Gauge("http_requests_in_flight", "Requests being handled", multiprocess_mode="livesum")
+
+    @app.before_request
+    def _start_timer():
+        if _sampler["thread"] is None:
+            _start_sampler()
+        g._metrics_start = time.perf_counter()
+        g._metrics_in_flight = True
+        in_flight.inc()
+
+    @app.after_request
+    def _observe(response):
+        start = g.pop("_metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "<unmatched>"
+            latency.labels(route, request.method, response.status_code).observe(time.perf_counter() - start)
+        return response
+
+    @app.teardown_request
+    def _finish(exc):
+        if g.pop("_metrics_in_flight", False):
+            in_flight.dec()
+
+    @app.route("/metrics", methods=["GET"])
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE_LATEST)
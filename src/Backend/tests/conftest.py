@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The services import their modules as top-level names, as in their containers
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (BACKEND, os.path.join(BACKEND, "Github_Gateway"), os.path.join(BACKEND, "Databank_api")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
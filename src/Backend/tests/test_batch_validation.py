@@ -0,0 +1,54 @@
+import logging
+
+import pytest
+
+import batch_validation
+from batch_validation import _validate_chunk, iter_glob
+
+
+class AcceptingValidator:
+    """Stands in for InfoSchemaValidator, every dict is valid."""
+
+    def validate(self, instance, limit=None):
+        return []
+
+
+@pytest.fixture
+def worker(monkeypatch):
+    monkeypatch.setattr(batch_validation, "_worker", {
+        "parse": lambda data, log: None,
+        "validator": AcceptingValidator(),
+        "log": logging.getLogger("test"),
+    })
+
+
+def test_string_list_items_are_never_opened(worker, tmp_path, monkeypatch):
+    (tmp_path / "info.yml").write_text("DOI: secret\n")
+    monkeypatch.chdir(tmp_path)
+
+    def no_open(*args, **kwargs):
+        raise AssertionError(f"opened {args[0]}")
+    monkeypatch.setattr(batch_validation, "open", no_open, raising=False)
+
+    results = _validate_chunk([(0, ("doc", "info.yml")), (1, ("doc", str(tmp_path / "info.yml"))),
+                               (2, ("doc", ["info.yml"]))])
+    assert [r["error"] for r in results] == ["Not a YAML mapping"] * 3
+    assert not any(r["valid"] for r in results)
+
+
+def test_documents_and_globbed_files_are_validated(worker, tmp_path):
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "info.yml").write_text("DOI: 10.1/a\n")
+    (tmp_path / "a" / "broken.yml").write_text("- not a mapping\n")
+    items = sorted(iter_glob(str(tmp_path), "**/*.yml"))
+    assert items == [("a/broken.yml", ("path", str(tmp_path / "a" / "broken.yml"))),
+                     ("a/info.yml", ("path", str(tmp_path / "a" / "info.yml")))]
+
+    results = _validate_chunk(items + [(0, ("doc", {"DOI": "10.1/b"}))])
+    assert [(r["id"], r["valid"]) for r in results] == [("a/broken.yml", False), ("a/info.yml", True), (0, True)]
+
+
+def test_glob_outside_base_is_rejected(tmp_path):
+    for pattern in ("../*.yml", "/etc/*.yml", "a/../../*.yml"):
+        with pytest.raises(ValueError):
+            iter_glob(str(tmp_path), pattern)
@@ -0,0 +1,189 @@
+import json
+import threading
+import time
+
+import pytest
+from github import GithubException
+
+from github_requests import (BACKGROUND, INTERACTIVE, UPLOAD, ConditionalCache, RateLimitExhausted,
+                             RateLimitScheduler)
+
+
+class FakeRequester:
+    """Stands in for PyGithub's Requester: answers GETs from a script and records the request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.rate_limiting = (-1, -1)
+        self.rate_limiting_resettime = 0
+
+    def requestJson(self, verb, url, headers=None):
+        self.requests.append((verb, url, dict(headers or {})))
+        status, resp_headers, data = self.responses.pop(0)
+        return status, resp_headers, json.dumps(data) if data is not None else ""
+
+
+def wait_for(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.01)
+
+
+# Conditional requests
+
+def test_first_get_is_unconditional_and_cached():
+    requester = FakeRequester((200, {"etag": '"v1"'}, {"name": "main"}))
+    cache = ConditionalCache()
+    data, headers = cache.get("repo", requester, "/branches/main")
+    assert data == {"name": "main"} and headers["etag"] == '"v1"'
+    assert requester.requests[0][2] == {}
+    assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_not_modified_replays_cached_copy():
+    requester = FakeRequester(
+        (200, {"etag": '"v1"', "last-modified": "Mon, 01 Jan 2024 00:00:00 GMT"}, {"name": "main"}),
+        (304, {}, None),
+    )
+    cache = ConditionalCache()
+    first = cache.get("repo", requester, "/branches/main")
+    assert cache.get("repo", requester, "/branches/main") == first
+    assert requester.requests[1][2] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_modified_answer_replaces_cached_copy():
+    requester = FakeRequester(
+        (200, {"etag": '"v1"'}, {"sha": "a"}),
+        (200, {"etag": '"v2"'}, {"sha": "b"}),
+        (304, {}, None),
+    )
+    cache = ConditionalCache()
+    cache.get("repo", requester, "/branches/main")
+    assert cache.get("repo", requester, "/branches/main")[0] == {"sha": "b"}
+    assert cache.get("repo", requester, "/branches/main")[0] == {"sha": "b"}
+    assert requester.requests[2][2] == {"If-None-Match": '"v2"'}
+
+
+def test_entries_are_scoped_per_key():
+    requester = FakeRequester((200, {"etag": '"v1"'}, {"p": "write"}), (200, {"etag": '"v1"'}, {"p": "read"}))
+    cache = ConditionalCache()
+    cache.get("token-a", requester, "/permission")
+    assert cache.get("token-b", requester, "/permission")[0] == {"p": "read"}
+    assert requester.requests[1][2] == {}
+
+
+def test_errors_raise_and_are_not_cached():
+    requester = FakeRequester((404, {}, {"message": "Not Found"}), (200, {"etag": '"v1"'}, {"name": "main"}))
+    cache = ConditionalCache()
+    with pytest.raises(GithubException):
+        cache.get("repo", requester, "/branches/gone")
+    cache.get("repo", requester, "/branches/gone")
+    assert requester.requests[1][2] == {}
+
+
+def test_least_recently_used_entries_are_dropped():
+    requester = FakeRequester(*[(200, {"etag": f'"{i}"'}, {"i": i}) for i in range(3)])
+    cache = ConditionalCache(max_entries=2)
+    for url in ("/a", "/b", "/c"):
+        cache.get("repo", requester, url)
+    assert cache.stats()["entries"] == 2
+    requester.responses.append((200, {"etag": '"a2"'}, {"i": 0}))
+    cache.get("repo", requester, "/a")
+    assert requester.requests[-1][2] == {}
+
+
+# Rate limit scheduling
+
+def test_requests_pass_while_quota_is_unknown_or_high():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=0)
+    scheduler.acquire("repo", BACKGROUND)
+    scheduler.update("repo", 100, 5000, time.time() + 3600)
+    scheduler.acquire("repo", BACKGROUND, cost=5)
+    assert scheduler.stats()["quotas"]["repo"]["remaining"] == 95
+    assert scheduler.queued["background"] == 0
+
+
+def test_low_quota_is_kept_for_higher_priorities():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=0)
+    scheduler.update("repo", 8, 5000, time.time() + 3600)
+    with pytest.raises(RateLimitExhausted):
+        scheduler.acquire("repo", BACKGROUND)
+    # Interactive lookups may go down to half the reserve, uploads to the last request
+    scheduler.acquire("repo", INTERACTIVE, cost=3)
+    with pytest.raises(RateLimitExhausted):
+        scheduler.acquire("repo", INTERACTIVE)
+    scheduler.acquire("repo", UPLOAD, cost=5)
+    with pytest.raises(RateLimitExhausted):
+        scheduler.acquire("repo", UPLOAD)
+    assert scheduler.rejected == {"upload": 1, "interactive": 1, "background": 1}
+
+
+def test_waiting_request_is_admitted_when_quota_comes_back():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=5)
+    scheduler.update("repo", 0, 5000, time.time() + 3600)
+    admitted = threading.Event()
+    thread = threading.Thread(target=lambda: (scheduler.acquire("repo", UPLOAD), admitted.set()))
+    thread.start()
+    wait_for(lambda: scheduler.stats()["quotas"]["repo"]["waiting"] == 1)
+    assert not admitted.is_set()
+    scheduler.update("repo", 3, 5000, time.time() + 3600)
+    assert admitted.wait(5)
+    thread.join()
+    assert scheduler.stats()["quotas"]["repo"]["remaining"] == 2
+
+
+def test_waiting_request_gives_up_after_max_wait():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=60)
+    reset = time.time() + 3600
+    scheduler.update("repo", 0, 5000, reset)
+    start = time.monotonic()
+    with pytest.raises(RateLimitExhausted) as raised:
+        scheduler.acquire("repo", UPLOAD, max_wait=0.2)
+    assert 0.2 <= time.monotonic() - start < 2
+    assert raised.value.reset == reset
+    assert scheduler.stats()["quotas"]["repo"]["waiting"] == 0
+
+
+def test_expired_window_admits_without_waiting():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=0)
+    scheduler.update("repo", 0, 5000, time.time() - 1)
+    scheduler.acquire("repo", BACKGROUND)
+
+
+def test_queued_requests_are_admitted_in_priority_order():
+    scheduler = RateLimitScheduler(reserve=10, max_wait=5)
+    scheduler.update("repo", 0, 5000, time.time() + 3600)
+    order = []
+
+    def request(priority, name, max_wait):
+        try:
+            scheduler.acquire("repo", priority, max_wait=max_wait)
+            order.append(name)
+        except RateLimitExhausted:
+            order.append(f"{name} rejected")
+
+    background = threading.Thread(target=request, args=(BACKGROUND, "background", 0.5))
+    background.start()
+    wait_for(lambda: scheduler.stats()["quotas"]["repo"]["waiting"] == 1)
+    upload = threading.Thread(target=request, args=(UPLOAD, "upload", 5))
+    upload.start()
+    wait_for(lambda: scheduler.stats()["quotas"]["repo"]["waiting"] == 2)
+    # Enough for the upload, not above the reserve the background request needs
+    scheduler.update("repo", 5, 5000, time.time() + 3600)
+    upload.join()
+    background.join()
+    assert order == ["upload", "background rejected"]
+
+
+def test_admit_records_quota_of_the_response():
+    scheduler = RateLimitScheduler(reserve=10)
+    requester = FakeRequester()
+    requester.rate_limiting = (42, 5000)
+    requester.rate_limiting_resettime = time.time() + 100
+    with scheduler.admit("repo", requester, INTERACTIVE):
+        pass
+    assert scheduler.stats()["quotas"]["repo"]["remaining"] == 42
+    assert scheduler.admitted["interactive"] == 1
@@ -0,0 +1,164 @@
+import glob
+import importlib
+import importlib.util
+import json
+import logging
+import os
+import types
+
+import pytest
+import yaml
+
+from schema_validator import UPSTREAM_MODULE, InfoSchemaValidator, check_info, error_key, probe_documents
+
+# At most this many info files of a BilayerData checkout are compared
+MAX_DATA_SAMPLES = 300
+
+
+def load_upstream():
+    """
+    The Databank's validate_yaml module. Importing it through fairmd.lipids needs a data
+    folder and the analysis dependencies, so it is loaded from its file when that fails.
+    """
+    try:
+        return importlib.import_module(UPSTREAM_MODULE)
+    except Exception:
+        pass
+    try:
+        spec = importlib.util.find_spec("fairmd")
+    except Exception:
+        spec = None
+    if spec is None or not spec.submodule_search_locations:
+        return None
+    path = os.path.join(list(spec.submodule_search_locations)[0], "lipids", "schema_validation", "validate_yaml.py")
+    if not os.path.isfile(path):
+        return None
+    module_spec = importlib.util.spec_from_file_location("databank_validate_yaml", path)
+    module = importlib.util.module_from_spec(module_spec)
+    module_spec.loader.exec_module(module)
+    return module
+
+
+upstream = load_upstream()
+needs_upstream = pytest.mark.skipif(upstream is None, reason="fairmd-lipids is not installed")
+
+
+def data_samples() -> list:
+    """Info files of the BilayerData checkout in BILAYERDATA_PATH or FMDL_DATA_PATH, if there is one."""
+    data_path = os.getenv("BILAYERDATA_PATH") or os.getenv("FMDL_DATA_PATH")
+    if not data_path or not os.path.isdir(data_path):
+        return []
+    paths = sorted(glob.glob(os.path.join(data_path, "**", "info*.yml"), recursive=True))[:MAX_DATA_SAMPLES]
+    return [pytest.param(path, id=os.path.relpath(path, data_path)) for path in paths]
+
+
+def same_errors(validator: InfoSchemaValidator, document) -> None:
+    ours = sorted(error_key(e) for e in validator.validate(document))
+    theirs = sorted(error_key(e) for e in upstream.validate_info_dict(document))
+    assert ours == theirs
+
+
+@pytest.fixture(scope="module")
+def validator():
+    validator = InfoSchemaValidator(upstream)
+    validator.reload()
+    return validator
+
+
+@needs_upstream
+def test_reload_finds_no_mismatch(validator):
+    assert not validator.delegating
+
+
+@needs_upstream
+def test_probe_documents_include_the_databank_template():
+    probes = probe_documents(upstream.default_info_schema_path)
+    assert len(probes) > 1, "info_template.yaml not found next to the schema"
+
+
+@needs_upstream
+def test_parity_on_template_and_variants(validator):
+    for document in probe_documents(upstream.default_info_schema_path):
+        same_errors(validator, document)
+
+
+@needs_upstream
+@pytest.mark.parametrize("path", data_samples())
+def test_parity_on_bilayerdata_info_files(validator, path):
+    with open(path, encoding="utf-8") as f:
+        document = yaml.safe_load(f)
+    same_errors(validator, document)
+
+
+def fake_upstream(tmp_path, validate_info_dict=None, with_filter=True):
+    """A validate_yaml module with a small schema, validating like the Databank unless told otherwise."""
+    schema_path = tmp_path / "info_schema.json"
+    schema_path.write_text(json.dumps({
+        "$schema": "http://json-schema.org/draft-07/schema#",
+        "type": "object",
+        "required": ["DOI"],
+        "properties": {"DOI": {"type": "string"}, "DATE": {"type": "string", "format": "date"}},
+    }))
+    (tmp_path / "info_template.yaml").write_text("DOI: 10.5281/zenodo.0000000\nDATE: 2021-02-23\n")
+    module = types.SimpleNamespace(default_info_schema_path=str(schema_path))
+    exec(compile(
+        "import datetime, json\n"
+        "from jsonschema import Draft7Validator, FormatChecker\n"
+        "def _filter_yaml_date_string_type_errors(errors):\n"
+        "    return [e for e in errors if not (e.validator == 'type' and\n"
+        "            isinstance(e.instance, (datetime.date, datetime.datetime)))]\n"
+        "_date_filter = _filter_yaml_date_string_type_errors\n"
+        "def validate_info_dict(instance, schema_path=default_info_schema_path):\n"
+        "    with open(schema_path) as f:\n"
+        "        schema = json.load(f)\n"
+        "    validator = Draft7Validator(schema, format_checker=FormatChecker())\n"
+        "    return _date_filter(list(validator.iter_errors(instance)))\n",
+        "fake_validate_yaml", "exec"), module.__dict__)
+    if validate_info_dict is not None:
+        module.validate_info_dict = validate_info_dict
+    if not with_filter:
+        del module._filter_yaml_date_string_type_errors
+    return module
+
+
+def test_matching_upstream_uses_the_precompiled_validator(tmp_path):
+    module = fake_upstream(tmp_path)
+    validator = InfoSchemaValidator(module)
+    validator.reload()
+    assert not validator.delegating
+    assert [e.validator for e in validator.validate({"DATE": "yesterday"})] == ["required", "format"]
+
+
+def test_diverging_upstream_is_delegated_to(tmp_path):
+    # As if the Databank stopped checking formats
+    module = fake_upstream(tmp_path, validate_info_dict=lambda instance: [])
+    validator = InfoSchemaValidator(module)
+    validator.reload()
+    assert validator.delegating
+    assert validator.validate({}) == []
+
+
+def test_missing_date_filter_is_delegated_to(tmp_path):
+    validator = InfoSchemaValidator(fake_upstream(tmp_path, with_filter=False))
+    validator.reload()
+    assert validator.delegating
+    assert [e.validator for e in validator.validate({})] == ["required"]
+
+
+def test_check_info_notes_only_a_cut_short_validation(tmp_path):
+    validator = InfoSchemaValidator(fake_upstream(tmp_path))
+    validator.reload()
+    log = logging.getLogger("test")
+    # Two errors: DOI is missing and DATE is no date
+    document = {"DATE": "yesterday"}
+
+    error, cacheable = check_info(document, lambda data, log: None, validator, log, limit=2)
+    assert cacheable and len(error.splitlines()) == 2
+    assert "validation stopped" not in error
+
+    error, _ = check_info(document, lambda data, log: None, validator, log, limit=1)
+    assert error.splitlines()[-1] == "(validation stopped after 1 error(s))"
+    assert len(error.splitlines()) == 2
+
+    errors, _ = check_info(document, lambda data, log: None, validator, log, limit=1, structured=True)
+    assert [e["validator"] for e in errors] == ["required"]
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import shared_state
+from shared_state import CatchUpRunner, SharedState
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_poll_returns_each_newer_generation_once(tmp_path):
+    writer, reader = SharedState(str(tmp_path)), SharedState(str(tmp_path))
+    assert reader.poll() is None
+
+    with writer.locked():
+        assert writer.publish({"Databank": "a"}) == 1
+    state = reader.poll()
+    assert state["generation"] == 1 and state["heads"] == {"Databank": "a"}
+    assert reader.poll() is None
+
+    with writer.locked():
+        writer.publish({"Databank": "b"})
+    assert reader.poll()["generation"] == 2
+
+
+def test_poll_ignores_own_publish(tmp_path):
+    state = SharedState(str(tmp_path))
+    with state.locked():
+        state.publish({"Databank": "a"})
+    assert state.poll() is None
+
+
+def test_published_this_boot(tmp_path, monkeypatch):
+    state = SharedState(str(tmp_path))
+    with state.locked():
+        state.publish({"Databank": "a"})
+    assert state.published_this_boot()["generation"] == 1
+    monkeypatch.setattr(shared_state, "BOOT_ID", "another-start")
+    assert state.published_this_boot() is None
+
+
+def test_lock_is_exclusive(tmp_path):
+    first, second = SharedState(str(tmp_path)), SharedState(str(tmp_path))
+    handle = first.acquire()
+    assert second.acquire(blocking=False) is None
+    first.release(handle)
+    handle = second.acquire(blocking=False)
+    assert handle is not None
+    second.release(handle)
+
+
+def test_catch_up_runs_again_for_generation_requested_during_a_run():
+    started, release, done = threading.Event(), threading.Event(), threading.Event()
+    runs = []
+
+    def reload(generation):
+        runs.append(generation)
+        if len(runs) == 1:
+            started.set()
+            release.wait(5)
+        else:
+            done.set()
+
+    runner = CatchUpRunner(reload)
+    assert runner.request(1)
+    assert started.wait(5)
+    # Published while the first reload is still running: neither may be dropped
+    assert not runner.request(2)
+    assert not runner.request(3)
+    release.set()
+    assert done.wait(5)
+    wait_until(lambda: not runner.running)
+    assert runs == [1, 3]
+    assert not runner.running
+
+
+def test_catch_up_keeps_going_after_a_failed_run():
+    calls = []
+    done = threading.Event()
+
+    def reload(generation):
+        calls.append(generation)
+        done.set()
+        raise RuntimeError("broken checkout")
+
+    runner = CatchUpRunner(reload)
+    runner.request(1)
+    assert done.wait(5)
+    wait_until(lambda: not runner.running)
+    assert not runner.running
+    done.clear()
+    assert runner.request(2)
+    assert done.wait(5)
+    assert calls == [1, 2]
@@ -0,0 +1,90 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+BENCHMARKS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks")
+
+
+@pytest.fixture(scope="module")
+def gateway(tmp_path_factory):
+    """The gateway app with the upload checks stubbed out and no upload workers, so jobs stay queued."""
+    sys.path.insert(0, BENCHMARKS)
+    from upload_benchmark import gateway_env
+
+    with pytest.MonkeyPatch.context() as patch:
+        for name, value in {
+            # Nothing listens here, the tests must not reach GitHub
+            **gateway_env("http://127.0.0.1:9"),
+            "OAUTH_ID": "test-oauth", "OAUTH_SECRET": "test-secret",
+            "UPLOAD_QUEUE_DB": str(tmp_path_factory.mktemp("queue") / "upload_jobs.sqlite3"),
+            "UPLOAD_WORKERS": "0",
+            "LOG_FORMAT": "text",
+        }.items():
+            patch.setenv(name, value)
+        app = importlib.import_module("app")
+        patch.setattr(app, "authorizeToken", lambda token, timeout=None: ({"token": "ok"}, None, 200))
+        patch.setattr(app.utils, "get_user_login", lambda token, timeout=None: "alice")
+        patch.setattr(app.utils, "is_input_invalid", lambda data, timeout=None: None)
+        yield app
+    sys.path.remove(BENCHMARKS)
+
+
+def upload(client, info, key=None):
+    headers = {"Authorization": "Bearer user-token"}
+    if key:
+        headers["Idempotency-Key"] = key
+    return client.post("/upload", json={"userName": "Alice", "branch": "main", **info}, headers=headers)
+
+
+def test_repeated_upload_returns_the_queued_job(gateway):
+    client = gateway.app.test_client()
+    first = upload(client, {"DOI": "10.1/a"})
+    assert first.status_code == 202
+    job_id = first.get_json()["jobId"]
+    assert not first.get_json().get("duplicate")
+
+    again = upload(client, {"DOI": "10.1/a"})
+    assert again.status_code == 202
+    assert again.get_json()["jobId"] == job_id
+    assert again.get_json()["duplicate"] is True
+
+
+def test_repeated_upload_of_finished_job_returns_its_pull_request(gateway):
+    client = gateway.app.test_client()
+    job_id = upload(client, {"DOI": "10.1/b"}).get_json()["jobId"]
+    gateway.upload_queue.update(job_id, state="succeeded", pull_url="https://github.com/o/r/pull/7")
+
+    again = upload(client, {"DOI": "10.1/b"})
+    assert again.status_code == 200
+    assert again.get_json()["jobId"] == job_id
+    assert again.get_json()["pullUrl"] == "https://github.com/o/r/pull/7"
+
+
+def test_different_content_is_a_new_job(gateway):
+    client = gateway.app.test_client()
+    first = upload(client, {"DOI": "10.1/c"}).get_json()["jobId"]
+    second = upload(client, {"DOI": "10.1/d"})
+    assert second.status_code == 202
+    assert second.get_json()["jobId"] != first
+
+
+def test_idempotency_key_reused_with_different_body_is_rejected(gateway):
+    client = gateway.app.test_client()
+    first = upload(client, {"DOI": "10.1/e"}, key="retry-1")
+    assert first.status_code == 202
+
+    assert upload(client, {"DOI": "10.1/f"}, key="retry-1").status_code == 422
+    same = upload(client, {"DOI": "10.1/e"}, key="retry-1")
+    assert same.status_code == 202
+    assert same.get_json()["jobId"] == first.get_json()["jobId"]
+
+
+def test_failed_job_can_be_uploaded_again(gateway):
+    client = gateway.app.test_client()
+    job_id = upload(client, {"DOI": "10.1/g"}).get_json()["jobId"]
+    gateway.upload_queue.update(job_id, state="failed")
+    again = upload(client, {"DOI": "10.1/g"})
+    assert again.status_code == 202
+    assert again.get_json()["jobId"] != job_id
@@ -0,0 +1,78 @@
+import threading
+
+import pytest
+
+from upload_jobs import IdempotencyConflict, UploadQueue
+
+STAGES = ("sync", "commit", "pull_request")
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return UploadQueue(str(tmp_path / "jobs.sqlite3"), STAGES, attempts=2, backoff=0)
+
+
+def test_duplicate_of_pending_job_returns_it(queue):
+    job_id, created = queue.enqueue({"n": 1}, "content:a", "a")
+    assert created
+    assert queue.enqueue({"n": 1}, "content:a", "a") == (job_id, False)
+    assert queue.duplicates == 1
+    assert queue.counts() == {"queued": 1}
+
+
+def test_duplicate_of_succeeded_job_returns_it(queue):
+    job_id, _ = queue.enqueue({"n": 1}, "content:a", "a")
+    queue.update(job_id, state="succeeded", pull_url="https://example.org/pull/1")
+    assert queue.enqueue({"n": 1}, "content:a", "a") == (job_id, False)
+    assert queue.status(job_id)["pullUrl"] == "https://example.org/pull/1"
+
+
+def test_failed_job_releases_its_key(queue):
+    job_id, _ = queue.enqueue({"n": 1}, "content:a", "a")
+    queue.update(job_id, state="failed")
+    retry_id, created = queue.enqueue({"n": 1}, "content:a", "a")
+    assert created and retry_id != job_id
+
+
+def test_key_expires_after_dedup_window(tmp_path):
+    queue = UploadQueue(str(tmp_path / "jobs.sqlite3"), STAGES, dedup_window=0)
+    job_id, _ = queue.enqueue({"n": 1}, "content:a", "a")
+    later_id, created = queue.enqueue({"n": 1}, "content:a", "a")
+    assert created and later_id != job_id
+    assert queue.counts() == {"queued": 2}
+
+
+def test_key_reused_with_different_content_conflicts(queue):
+    job_id, _ = queue.enqueue({"n": 1}, "key:k", "a")
+    with pytest.raises(IdempotencyConflict, match=job_id):
+        queue.enqueue({"n": 2}, "key:k", "b")
+    assert queue.enqueue({"n": 1}, "key:k", "a") == (job_id, False)
+    assert queue.counts() == {"queued": 1}
+
+
+def test_jobs_without_key_are_not_deduplicated(queue):
+    assert queue.enqueue({"n": 1})[1]
+    assert queue.enqueue({"n": 1})[1]
+    assert queue.counts() == {"queued": 2}
+
+
+def test_concurrent_duplicates_create_one_job(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    # One queue object per thread, like separate gunicorn workers on one database
+    queues = [UploadQueue(path, STAGES) for _ in range(8)]
+    barrier = threading.Barrier(len(queues))
+    results = []
+
+    def submit(queue):
+        barrier.wait()
+        results.append(queue.enqueue({"n": 1}, "content:a", "a"))
+
+    threads = [threading.Thread(target=submit, args=(q,)) for q in queues]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len({job_id for job_id, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    assert queues[0].counts() == {"queued": 1}
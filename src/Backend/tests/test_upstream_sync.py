@@ -0,0 +1,47 @@
+from upstream_sync import UpstreamSync
+
+
+class FakeUpstream:
+    """merge() answers from a script of successes, head(etag) reports a fixed upstream SHA."""
+
+    def __init__(self, *merge_results, sha="abc"):
+        self.merge_results = list(merge_results)
+        self.sha = sha
+        self.merges = 0
+        self.etags = []
+
+    def merge(self):
+        self.merges += 1
+        return self.merge_results.pop(0)
+
+    def head(self, etag):
+        self.etags.append(etag)
+        if etag == f'"{self.sha}"':
+            return 304, None, etag
+        return 200, self.sha, f'"{self.sha}"'
+
+
+def test_unchanged_upstream_is_merged_once():
+    upstream = FakeUpstream(True)
+    sync = UpstreamSync(upstream.merge, upstream.head, window=0)
+    assert [sync.sync() for _ in range(3)] == ["merged", "unchanged", "unchanged"]
+    assert upstream.merges == 1
+    assert upstream.etags == [None, '"abc"', '"abc"']
+
+
+def test_failed_merge_is_retried_by_the_next_sync():
+    upstream = FakeUpstream(False, False, True)
+    sync = UpstreamSync(upstream.merge, upstream.head, window=30)
+    assert [sync.sync() for _ in range(4)] == ["failed", "failed", "merged", "recent"]
+    assert upstream.merges == 3
+    # Nothing of a failed merge is kept, so the head is read without an etag again
+    assert upstream.etags == [None, None, None]
+    assert sync.stats()["failed"] == 2 and sync.stats()["merges"] == 1
+    assert sync.synced_sha == "abc"
+
+
+def test_failed_merge_records_no_sync():
+    upstream = FakeUpstream(False)
+    sync = UpstreamSync(upstream.merge, upstream.head)
+    assert sync.sync() == "failed"
+    assert (sync.synced_at, sync.synced_sha, sync._etag) == (None, None, None)
@@ -0,0 +1,233 @@
+import contextvars
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from flask import g, request
+
+# "json" writes one JSON object per log line with the trace and request ids, "text" keeps plain messages
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Append every finished span as a JSON line to this file, read by benchmarks/trace_waterfall.py
+TRACE_EXPORT_FILE = os.getenv("TRACE_EXPORT_FILE")
+
+TRACEPARENT = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+# nginx's $request_id has the shape of a trace id and is used as one
+HEX_REQUEST_ID = re.compile(r"^[0-9a-f]{32}$")
+
+logger = logging.getLogger('gunicorn.error')
+
+_current = contextvars.ContextVar("tracing_span", default=None)
+_service = {"name": os.getenv("SERVICE_NAME", "backend")}
+
+
+class Span:
+    """One timed operation of a trace. Ids follow W3C Trace Context."""
+
+    def __init__(self, name: str, trace_id: str, parent_id: str, request_id: str, attributes: dict):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.request_id = request_id
+        self.attributes = attributes
+        self.status = "ok"
+        self.start = time.time()
+        self.duration = None
+        self._perf_start = time.perf_counter()
+        self._token = None
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self) -> dict:
+        return {
+            "service": _service["name"],
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "request_id": self.request_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3) if self.duration is not None else None,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class FileExporter:
+    """Appends finished spans as JSON lines. Lines are short, so appends of several processes don't interleave."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = None
+
+    def export(self, record: dict) -> None:
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a", buffering=1, encoding="utf-8")
+            self._file.write(line)
+
+
+exporter = FileExporter(TRACE_EXPORT_FILE) if TRACE_EXPORT_FILE else None
+
+
+def parse_traceparent(value):
+    """(trace_id, parent span id) of a traceparent header, or None if it is missing or malformed."""
+    match = TRACEPARENT.match((value or "").strip().lower())
+    if match is None or set(match.group(1)) == {"0"} or set(match.group(2)) == {"0"}:
+        return None
+    return match.group(1), match.group(2)
+
+
+def current_span():
+    return _current.get()
+
+
+def start_span(name: str, parent: str = None, trace_id: str = None, request_id: str = None, **attributes) -> Span:
+    """
+    Start a span and make it the current one. It continues the trace of the traceparent
+    `parent` when given, else of the current span, else trace_id or a new trace.
+    """
+    parent_id = None
+    parsed = parse_traceparent(parent)
+    current = _current.get()
+    if parsed is not None:
+        trace_id, parent_id = parsed
+    elif current is not None:
+        trace_id, parent_id = current.trace_id, current.span_id
+        request_id = request_id or current.request_id
+    trace_id = trace_id or secrets.token_hex(16)
+    span = Span(name, trace_id, parent_id, request_id or trace_id, attributes)
+    span._token = _current.set(span)
+    return span
+
+
+def end_span(span: Span, error: BaseException = None) -> None:
+    """Finish span, restore the span that was current before it, then log and export it."""
+    span.duration = time.perf_counter() - span._perf_start
+    if error is not None:
+        span.status = "error"
+        span.attributes.setdefault("error", f"{type(error).__name__}: {error}")
+    if span._token is not None:
+        try:
+            _current.reset(span._token)
+        except ValueError:
+            # Ended in another context than it was started in
+            _current.set(None)
+        span._token = None
+    record = span.to_dict()
+    logger.info(f"{span.name} took {record['duration_ms']} ms", extra={"span": record})
+    if exporter is not None:
+        try:
+            exporter.export(record)
+        except OSError as e:
+            logger.warning(f"Failed to export span: {e}")
+
+
+@contextmanager
+def span(name: str, parent: str = None, **attributes):
+    """Time the with block (or decorated function) as a span, marked as failed if it raises."""
+    current = start_span(name, parent, **attributes)
+    try:
+        yield current
+    except BaseException as e:
+        end_span(current, e)
+        raise
+    end_span(current)
+
+
+def inject(headers: dict = None) -> dict:
+    """Add traceparent and X-Request-ID of the current span to headers for an outgoing call."""
+    headers = dict(headers or {})
+    current = _current.get()
+    if current is not None:
+        headers["traceparent"] = current.traceparent
+        headers["X-Request-ID"] = current.request_id
+    return headers
+
+
+def current_traceparent():
+    current = _current.get()
+    return current.traceparent if current is not None else None
+
+
+class JsonFormatter(logging.Formatter):
+    """Log records as JSON objects with the service, the current trace ids and finished span fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "service": _service["name"],
+            "message": record.getMessage(),
+        }
+        record_span = getattr(record, "span", None)
+        if record_span is not None:
+            entry.update(record_span)
+        else:
+            current = _current.get()
+            if current is not None:
+                entry.update(trace_id=current.trace_id, span_id=current.span_id, request_id=current.request_id)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging() -> None:
+    """Switch the handlers of the gunicorn error logger and the root logger to JSON lines if LOG_FORMAT is json."""
+    if LOG_FORMAT != "json":
+        return
+    for log in (logging.getLogger('gunicorn.error'), logging.getLogger()):
+        for handler in log.handlers:
+            handler.setFormatter(JsonFormatter())
+
+
+def instrument_tracing(app, service: str) -> None:
+    """
+    Run every request of app in a span that continues the caller's trace.
+
+    The trace is taken from a W3C traceparent header, else from an X-Request-ID of
+    32 hex digits (as nginx's $request_id), else started anew. Responses carry the
+    request id and the request span's traceparent. Spans started while handling the
+    request, and outgoing calls made with inject(), belong to the same trace.
+    """
+    _service["name"] = service
+    configure_logging()
+
+    @app.before_request
+    def _start_request_span():
+        request_id = request.headers.get("X-Request-ID", "").strip()[:128] or None
+        trace_id = request_id.lower() if request_id and HEX_REQUEST_ID.match(request_id.lower()) else None
+        route = request.url_rule.rule if request.url_rule else "<unmatched>"
+        g._trace_span = start_span(f"{request.method} {route}", parent=request.headers.get("traceparent"),
+                                   trace_id=trace_id, request_id=request_id,
+                                   method=request.method, path=request.path)
+
+    @app.after_request
+    def _tag_response(response):
+        current = g.get("_trace_span")
+        if current is not None:
+            current.set(status_code=response.status_code)
+            if response.status_code >= 500:
+                current.status = "error"
+            response.headers["X-Request-ID"] = current.request_id
+            response.headers["traceparent"] = current.traceparent
+        return response
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        current = g.pop("_trace_span", None)
+        if current is not None:
+            end_span(current, exc)
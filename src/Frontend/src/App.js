@@ -14,7 +14,6 @@ import Information from './Components/Information';
 
 export default function App() {
   const OAUTH_ClientID = process.env.REACT_APP_OAUTH_CLIENT_ID;
-  const DataRepo = process.env.REACT_APP_DATA_REPO;
   const GITHUB_GATEWAY_PATH = '/app/';
   const API_PATH = '/api/';
   const [loggedIn, setLoggedIn] = useState(false);
@@ -55,14 +54,32 @@ useEffect(() => {
     .catch(err => console.error("Failed to load mappings:", err));
 }, []);  
 
+// Polls a background databank refresh until it has finished:
+const waitForRefresh = async jobId => {
+  for (;;) {
+    const resp = await axios.get(`${API_PATH}refresh-status/${jobId}`);
+    const { state, phases } = resp.data;
+    if (state === 'succeeded' || state === 'failed') return resp.data;
+    const current = Object.keys(phases).find(phase => phases[phase] === 'running');
+    setRefreshMessage(`Updating databank files${current ? ` (${current})` : ''}…`);
+    await new Promise(resolve => setTimeout(resolve, 2000));
+  }
+};
+
 // Function to update databank files:
 const updateDatabankFiles = async () => {
   try {
-    await axios.post(
+    const started = await axios.post(
       `${API_PATH}refresh-databank-files`,
       {},
       { headers: { Authorization: `Bearer ${localStorage.githubToken}` } }
     );
+    setRefreshMessage('Updating databank files…');
+    const job = await waitForRefresh(started.data.job_id);
+    if (job.state === 'failed') {
+      setRefreshMessage(`Refresh failed: ${job.error}`);
+      return;
+    }
     setRefreshMessage('Databank files updated successfully');
     // re-fetch updated lists
     const resp = await axios.get(`${API_PATH}molecules`);
@@ -130,6 +147,11 @@ useEffect(() => {
   };
 // Handles logout process:
   const handleLogout = () => {
+    if (localStorage.githubToken) {
+      axios.post(`${GITHUB_GATEWAY_PATH}logout`, {}, {
+        headers: { Authorization: `Bearer ${localStorage.githubToken}` }
+      }).catch(err => console.error("Failed to log out on server:", err));
+    }
     localStorage.clear();
     setLoggedIn(false);
     setAdminStatus(false)
@@ -144,6 +166,17 @@ useEffect(() => {
     setLastSavedFingerprint('');
   }
     
+// Polls a queued upload until its pull request has been created or it failed:
+const waitForUpload = async jobId => {
+  for (;;) {
+    const resp = await axios.get(`${GITHUB_GATEWAY_PATH}upload-status/${jobId}`);
+    const { state, stage } = resp.data;
+    if (state === 'succeeded' || state === 'failed') return resp.data;
+    setUploadStatus(`Uploading data…${stage ? ` (${stage.replace('_', ' ')})` : ''}`);
+    await new Promise(resolve => setTimeout(resolve, 1500));
+  }
+};
+
 // Handles form submission:
 const handleSubmit = async e => {
   e.preventDefault();
@@ -190,11 +223,16 @@ const handleSubmit = async e => {
         Authorization: `Bearer ${localStorage.githubToken}`
       }
     });
+    const job = await waitForUpload(resp.data.jobId);
+    if (job.state === 'failed') {
+      setUploadStatus(`Upload failed: ${job.error}`);
+      return;
+    }
     setUploadStatus('Upload succeeded!');
     setLastSavedFingerprint(fingerprint);
     
-    if (resp.data.pullUrl) {
-      setPullRequestUrl(resp.data.pullUrl);
+    if (job.pullUrl) {
+      setPullRequestUrl(job.pullUrl);
     }
 
   } catch (err) {
@@ -258,7 +296,6 @@ return (
               selectedBranch={branch}
               setSelectedBranch={setBranch}
               setMessage={setMessage}
-              DataRepo={DataRepo}
             />
           {message && <p className="status-message-centered">Status: {message}</p>}
 
@@ -1,7 +1,7 @@
 import { useState, useEffect } from 'react';
 import axios from 'axios';
 
-function BranchSelect({ selectedBranch, setSelectedBranch, setMessage, DataRepo }) {  
+function BranchSelect({ selectedBranch, setSelectedBranch, setMessage }) {  
   const [branches, setBranches] = useState([]); 
 
   const DEV_MODE = process.env.REACT_APP_DEV_MODE === 'TRUE';
@@ -11,8 +11,9 @@ function BranchSelect({ selectedBranch, setSelectedBranch, setMessage, DataRepo
 
     const fetchBranches = async () => {
       try {
-        const response = await axios.get(`https://api.github.com/repos/${DataRepo}/branches`);
-        const branchNames = response.data.map(branch => branch.name);
+        // Served from the gateway's cache of the data repository, not per browser from api.github.com
+        const response = await axios.get('/app/branches');
+        const branchNames = response.data.branches;
         setBranches(branchNames);
 
         if (branchNames.includes("main")) {
@@ -27,7 +28,7 @@ function BranchSelect({ selectedBranch, setSelectedBranch, setMessage, DataRepo
     };
 
     fetchBranches();
-  },  [DataRepo, DEV_MODE]);
+  },  [DEV_MODE]);
 
   if (!DEV_MODE) return null;
 